@@ -1,25 +1,66 @@
 from app.database.models import db_drop_and_create_all
 from flask import Flask
 from flask_cors import CORS
-from .database.models import db_drop_and_create_all, setup_db, populate_db
+from .database.models import (
+    db_drop_and_create_all,
+    setup_db,
+    populate_db,
+    verify_schema_revision,
+)
+from .database import versions  # registers the table version events
+from .bulk import init_bulk
+from .cache import response_cache
+from .compression import init_compression
+from .counts import init_counts
+from .diagnostics import query_diagnostics
+from .metrics import metrics
+from .serialization import json_serializer
+import logging
 import os
+import time
 
 
 def create_app(testing):
+    started = time.perf_counter()
+
     # create and configure the app
     app = Flask(__name__, instance_relative_config=False)
-    app.config.from_object("config.DevConfig")
+    app.config.from_object(os.getenv("APP_CONFIG", "config.DevConfig"))
 
     if testing:
         app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_TEST_URI")
+        # Requests over their @query_budget fail the tests
+        app.config["QUERY_DIAGNOSTICS"] = True
+        app.config["QUERY_BUDGET_ENFORCE"] = True
+
+    if not app.logger.level:
+        app.logger.setLevel(logging.INFO)
 
     CORS(app)
     setup_db(app)
+    response_cache.init_app(app)
+    json_serializer.init_app(app)
+    init_counts(app)
+    init_bulk(app)
+    # Registered before compression so its time is part of the latency
+    metrics.init_app(app)
+    query_diagnostics.init_app(app)
+    init_compression(app)
 
     with app.app_context():
         from . import routes  # Import routes
 
-        db_drop_and_create_all()
-        populate_db()
+        if app.config["DB_STARTUP"] == "reset":
+            db_drop_and_create_all()
+            populate_db()
+        else:
+            verify_schema_revision()
+
+        app.config["STARTUP_SECONDS"] = time.perf_counter() - started
+        app.logger.info(
+            "App started in %.1f ms (DB_STARTUP=%s)",
+            app.config["STARTUP_SECONDS"] * 1000,
+            app.config["DB_STARTUP"],
+        )
 
         return app
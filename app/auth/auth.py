@@ -1,15 +1,73 @@
+import time
 from os import getenv
-import json
 from flask import request
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+from ..metrics import Gauge, metrics
+from .jwks import JWKSCache, JWKSUnavailable
+from .tokens import VerifiedTokenCache
 
 
 AUTH0_DOMAIN = getenv("AUTH0_DOMAIN", None)
 ALGORITHMS = getenv("ALGORITHMS", None)
 API_AUDIENCE = getenv("API_AUDIENCE", None)
 
+# JWKS_URL may point at a local file (file://) or HTTP stand-in for testing
+JWKS_URL = getenv("JWKS_URL", f"https://{AUTH0_DOMAIN}/.well-known/jwks.json")
+JWKS_TTL = int(getenv("JWKS_TTL", 600))
+JWKS_REFRESH_MARGIN = int(getenv("JWKS_REFRESH_MARGIN", 60))
+JWKS_MIN_REFRESH_INTERVAL = int(getenv("JWKS_MIN_REFRESH_INTERVAL", 10))
+JWKS_BACKGROUND_REFRESH = getenv("JWKS_BACKGROUND_REFRESH", "1") == "1"
+
+jwks_cache = JWKSCache(
+    JWKS_URL,
+    ttl=JWKS_TTL,
+    refresh_margin=JWKS_REFRESH_MARGIN,
+    min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL,
+    background_refresh=JWKS_BACKGROUND_REFRESH,
+)
+
+# Verified tokens are reused until they expire; 0 disables the cache
+TOKEN_CACHE_SIZE = int(getenv("TOKEN_CACHE_SIZE", 1024))
+
+token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE)
+jwks_cache.on_rotate(lambda cache: token_cache.clear())
+
+metrics.add(
+    Gauge(
+        "auth_jwks_fetches_total",
+        "JWKS fetches, failed fetches and tokens with an unknown kid",
+        lambda: {
+            ("fetch",): jwks_cache.fetches,
+            ("error",): jwks_cache.errors,
+            ("kid_miss",): jwks_cache.kid_misses,
+        },
+        labels=("event",),
+        type="counter",
+    )
+)
+metrics.add(
+    Gauge(
+        "auth_jwks_fetch_seconds_total",
+        "Time spent fetching the JWKS",
+        lambda: jwks_cache.fetch_seconds,
+        type="counter",
+    )
+)
+metrics.add(
+    Gauge(
+        "auth_token_cache_events_total",
+        "Verified token cache hits, misses and evictions",
+        lambda: {
+            (name,): value
+            for name, value in token_cache.stats().items()
+            if name not in ("size", "max_size")
+        },
+        labels=("event",),
+        type="counter",
+    )
+)
+
 
 class AuthError(Exception):
     def __init__(self, error, status_code):
@@ -31,25 +89,19 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f"https://{AUTH0_DOMAIN}/.well-known/jwks.json")
-    jwks = json.loads(jsonurl.read())
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
 
     unverified_header = jwt.get_unverified_header(token)
 
-    rsa_key = {}
-
     if "kid" not in unverified_header:
         raise AuthError("Invalid Header", 401)
 
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"],
-            }
+    try:
+        rsa_key = jwks_cache.get_key(unverified_header["kid"])
+    except JWKSUnavailable:
+        raise AuthError("Signing keys unavailable", 503)
 
     if rsa_key:
         try:
@@ -60,7 +112,7 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer="https://" + AUTH0_DOMAIN + "/",
             )
-            return payload
+            return token_cache.put(token, payload)
 
         except jwt.ExpiredSignatureError:
             raise AuthError("Token Expired", 401)
@@ -87,7 +139,16 @@ def requires_auth(permission=""):
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
+            if metrics.enabled:
+                started = time.perf_counter()
+                try:
+                    payload = verify_decode_jwt(token)
+                finally:
+                    metrics.jwt_verify_duration.observe(
+                        time.perf_counter() - started
+                    )
+            else:
+                payload = verify_decode_jwt(token)
             check_permissions(permission, payload)
             return f(payload, *args, **kwargs)
 
@@ -0,0 +1,169 @@
+import json
+import logging
+import threading
+import time
+from os import getpid
+from urllib.request import urlopen
+
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ("kty", "kid", "use", "n", "e")
+
+
+class JWKSUnavailable(Exception):
+    """Raised when no signing keys could be fetched and none are cached"""
+
+
+class JWKSCache:
+    """Process-wide cache of the signing keys published at a JWKS url.
+
+    Keys are held for ``ttl`` seconds. A token signed with an unknown
+    ``kid`` triggers at most one refresh at a time (and at most one every
+    ``min_refresh_interval`` seconds), a background thread renews the keys
+    ``refresh_margin`` seconds before they expire, and if the identity
+    provider cannot be reached the last good keys keep being served.
+    """
+
+    def __init__(
+        self,
+        url,
+        ttl=600,
+        refresh_margin=60,
+        min_refresh_interval=10,
+        retry_interval=30,
+        timeout=5,
+        background_refresh=True,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.background_refresh = background_refresh
+
+        self.version = 0
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self.errors = 0
+        self.kid_misses = 0
+
+        self._keys = {}
+        self._expires_at = 0
+        self._last_refresh = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._refresher_pid = None
+
+    def on_rotate(self, listener):
+        """Register a callable run whenever the published key set changes"""
+        self._listeners.append(listener)
+
+    def get_key(self, kid):
+        """Return the key for ``kid``, or None if no such key is published"""
+        keys = self._keys
+        now = time.monotonic()
+
+        if kid in keys and now < self._expires_at:
+            return keys[kid]
+
+        generation = self._generation
+        with self._lock:
+            now = time.monotonic()
+            fresh = now < self._expires_at
+
+            if self._generation != generation and fresh:
+                # Another thread refreshed while we were waiting on the lock
+                return self._keys.get(kid)
+
+            if fresh:
+                if kid in self._keys:
+                    return self._keys[kid]
+                self.kid_misses += 1
+                if now - self._last_refresh < self.min_refresh_interval:
+                    return None
+
+            self._refresh_locked()
+
+        self._ensure_refresher()
+        return self._keys.get(kid)
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_locked()
+
+    def _fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _refresh_locked(self):
+        now = time.monotonic()
+        self._last_refresh = now
+        self.fetches += 1
+
+        try:
+            try:
+                jwks = self._fetch()
+            finally:
+                self.fetch_seconds += time.monotonic() - now
+            keys = {
+                key["kid"]: {
+                    field: key[field] for field in KEY_FIELDS if field in key
+                }
+                for key in jwks["keys"]
+            }
+        except Exception as error:
+            self.errors += 1
+            if not self._keys:
+                raise JWKSUnavailable(str(error)) from error
+
+            logger.warning(
+                "Could not refresh JWKS from %s, serving stale keys: %s",
+                self.url,
+                error,
+            )
+            self._expires_at = now + self.retry_interval
+            return
+
+        rotated = keys != self._keys
+        self._keys = keys
+        self._expires_at = now + self.ttl
+        self._generation += 1
+
+        if rotated:
+            self.version += 1
+            for listener in self._listeners:
+                listener(self)
+
+    def _ensure_refresher(self):
+        # Threads do not survive a fork, so each worker starts its own
+        if not self.background_refresh or self._refresher_pid == getpid():
+            return
+
+        with self._lock:
+            # Checked again, another request may have started it meanwhile
+            if self._refresher_pid == getpid():
+                return
+            self._refresher_pid = getpid()
+            thread = threading.Thread(
+                target=self._refresh_loop, name="jwks-refresher", daemon=True
+            )
+            thread.start()
+
+    def _refresh_loop(self):
+        pid = getpid()
+        while self._refresher_pid == pid:
+            delay = self._expires_at - self.refresh_margin - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+
+            try:
+                self.refresh()
+            except JWKSUnavailable:
+                pass
+
+            # Keys that failed to refresh are retried after retry_interval
+            time.sleep(max(min(self.retry_interval, self.ttl), 1))
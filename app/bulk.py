@@ -0,0 +1,323 @@
+import json
+from flask import request, abort
+from sqlalchemy import and_, exists
+from .cache import response_cache
+from .database.models import db, Player, Team
+from .filters import PLAYER_FILTERS
+
+BULK_MAX_ITEMS = 10000
+BULK_CHUNK_SIZE = 500
+
+PLAYER_FIELDS = ("name", "gender", "jersey_number", "position", "team_id")
+TEAM_FIELDS = ("name", "location", "division", "level")
+TEAM_DELETE_POLICIES = ("detach", "cascade", "restrict")
+
+
+def init_bulk(app):
+    policy = app.config.setdefault("TEAM_DELETE_POLICY", "detach")
+    if policy not in TEAM_DELETE_POLICIES:
+        raise ValueError(f"Unknown TEAM_DELETE_POLICY {policy!r}")
+
+
+def chunked(items, size=BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def parse_bulk_items(key):
+    """Read the items of a bulk request.
+
+    Accepts a JSON array, a JSON object holding the array under ``key``,
+    or an NDJSON body with one item per line. NDJSON lines that are not
+    valid JSON are passed on as None so they are reported per item.
+    """
+    if request.mimetype == "application/x-ndjson":
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+    else:
+        body = request.get_json(silent=True)
+        items = body.get(key) if isinstance(body, dict) else body
+
+    if not isinstance(items, list) or not items:
+        abort(422)
+    if len(items) > BULK_MAX_ITEMS:
+        abort(413)
+
+    return items
+
+
+def validate_item(item, table, fields):
+    """Check an item against the column types, lengths and nullability"""
+    if not isinstance(item, dict):
+        return None, ["item must be a JSON object"]
+
+    row = {}
+    errors = []
+
+    for name in fields:
+        column = table.c[name]
+        value = item.get(name)
+
+        if value is None:
+            if not column.nullable:
+                errors.append(f"{name} is required")
+            row[name] = None
+            continue
+
+        python_type = column.type.python_type
+        if python_type is int:
+            if not isinstance(value, int) or isinstance(value, bool):
+                errors.append(f"{name} must be an integer")
+        elif not isinstance(value, str):
+            errors.append(f"{name} must be a string")
+        elif column.type.length and len(value) > column.type.length:
+            errors.append(
+                f"{name} must be at most {column.type.length} characters"
+            )
+
+        row[name] = value
+
+    return row, errors
+
+
+def existing_team_ids(team_ids):
+    found = set()
+    for chunk in chunked(sorted(team_ids)):
+        found.update(
+            team_id
+            for (team_id,) in db.session.query(Team.id).filter(
+                Team.id.in_(chunk)
+            )
+        )
+    return found
+
+
+def insert_rows(table, rows):
+    """Insert rows in the current transaction and return their new ids.
+
+    Postgres gets multi-row INSERT ... RETURNING statements, other
+    backends fall back to one INSERT per row in the same transaction.
+    """
+    if db.engine.dialect.name == "postgresql":
+        ids = []
+        for chunk in chunked(rows):
+            result = db.session.execute(
+                table.insert().values(chunk).returning(table.c.id)
+            )
+            ids.extend(row_id for (row_id,) in result)
+        return ids
+
+    return [
+        db.session.execute(table.insert(), row).inserted_primary_key[0]
+        for row in rows
+    ]
+
+
+def bulk_failure(index, errors):
+    return {"index": index, "success": False, "errors": errors}
+
+
+def bulk_create(model, items, fields, atomic=False):
+    """Insert every valid item in one transaction, reporting each result.
+
+    With ``atomic`` nothing is inserted unless every item is valid.
+    """
+    table = model.__table__
+    results = [None] * len(items)
+    valid = []
+
+    for index, item in enumerate(items):
+        row, errors = validate_item(item, table, fields)
+        if errors:
+            results[index] = bulk_failure(index, errors)
+        else:
+            valid.append((index, row))
+
+    team_ids = {
+        row["team_id"] for _, row in valid if row.get("team_id") is not None
+    }
+    if team_ids:
+        missing = team_ids - existing_team_ids(team_ids)
+        for index, row in valid:
+            if row.get("team_id") in missing:
+                results[index] = bulk_failure(
+                    index, ["team_id does not exist"]
+                )
+        valid = [(i, row) for i, row in valid if results[i] is None]
+
+    failed = len(items) - len(valid)
+    if atomic and failed:
+        for index, _ in valid:
+            results[index] = bulk_failure(
+                index, ["not created because other items failed"]
+            )
+        valid = []
+
+    ids = insert_rows(table, [row for _, row in valid]) if valid else []
+    db.session.commit()
+
+    if ids:
+        tags = {table.name + "s"}
+        if model is Player:
+            tags.add("teams")
+            tags.update(f"team:{team_id}" for team_id in team_ids)
+        response_cache.invalidate(tags)
+
+    for (index, _), row_id in zip(valid, ids):
+        results[index] = {"index": index, "success": True, "id": row_id}
+
+    return {
+        "success": failed == 0,
+        "created": len(ids),
+        "failed": failed,
+        "results": results,
+    }
+
+
+def bulk_create_players(items, atomic=False):
+    return bulk_create(Player, items, PLAYER_FIELDS, atomic=atomic)
+
+
+def bulk_create_teams(items, atomic=False):
+    return bulk_create(Team, items, TEAM_FIELDS, atomic=atomic)
+
+
+def player_selection(body):
+    """Criteria for the players a bulk change applies to.
+
+    Players are picked by a list of ``ids`` or by a ``filter`` object on
+    team_id, position, gender and jersey_number (``{"team_id": null}``
+    selects players without a team).
+    """
+    if not isinstance(body, dict):
+        abort(422)
+
+    ids = body.get("ids")
+    filters = body.get("filter")
+
+    if ids is not None:
+        if (
+            not isinstance(ids, list)
+            or not ids
+            or len(ids) > BULK_MAX_ITEMS
+            or not all(
+                isinstance(i, int) and not isinstance(i, bool) for i in ids
+            )
+        ):
+            abort(422)
+        return [Player.id.in_(ids)]
+
+    if not isinstance(filters, dict) or not filters:
+        abort(422)
+    if any(name not in PLAYER_FILTERS for name in filters):
+        abort(422)
+
+    return [getattr(Player, name) == value for name, value in filters.items()]
+
+
+def validate_changes(changes, table, fields):
+    if not isinstance(changes, dict) or not changes:
+        abort(422)
+    if any(name not in fields for name in changes):
+        abort(422)
+
+    values, errors = validate_item(changes, table, tuple(changes))
+    if errors:
+        abort(422)
+
+    return values
+
+
+def execute_for_ids(statement, criteria):
+    """Run a set-based UPDATE or DELETE and return the affected ids"""
+    table = Player.__table__
+    statement = statement.where(and_(*criteria))
+
+    if db.engine.dialect.name == "postgresql":
+        result = db.session.execute(statement.returning(table.c.id))
+        return sorted(player_id for (player_id,) in result)
+
+    ids = [
+        player_id
+        for (player_id,) in db.session.query(Player.id)
+        .filter(*criteria)
+        .order_by(Player.id)
+        .with_for_update()
+    ]
+    db.session.execute(statement)
+    return ids
+
+
+def bulk_update_players(body):
+    criteria = player_selection(body)
+    values = validate_changes(body.get("set"), Player.__table__, PLAYER_FIELDS)
+
+    team_id = values.get("team_id")
+    if team_id is not None and not existing_team_ids({team_id}):
+        abort(422)
+
+    table = Player.__table__
+    values["version"] = table.c.version + 1
+    ids = execute_for_ids(table.update().values(values), criteria)
+    db.session.commit()
+
+    # The previous teams of the moved players are not known here
+    response_cache.clear()
+
+    return ids
+
+
+def bulk_delete_players(body):
+    criteria = player_selection(body)
+
+    ids = execute_for_ids(Player.__table__.delete(), criteria)
+    db.session.commit()
+    response_cache.clear()
+
+    return ids
+
+
+def bulk_delete_team(team_id, policy="detach"):
+    """Delete a team, handling its whole roster in one statement.
+
+    ``detach`` releases the players, ``cascade`` deletes them and
+    ``restrict`` refuses to delete a team that has players with a 409.
+    Returns the ids of the released or deleted players.
+    """
+    if policy not in TEAM_DELETE_POLICIES:
+        raise ValueError(f"Unknown team delete policy {policy!r}")
+
+    criteria = [Player.team_id == team_id]
+    players = Player.__table__
+    if policy == "restrict":
+        if db.session.query(exists().where(and_(*criteria))).scalar():
+            abort(409)
+        ids = []
+    elif policy == "cascade":
+        ids = execute_for_ids(players.delete(), criteria)
+    else:
+        ids = execute_for_ids(
+            players.update().values(
+                team_id=None, version=players.c.version + 1
+            ),
+            criteria,
+        )
+
+    teams = Team.__table__
+    result = db.session.execute(teams.delete().where(teams.c.id == team_id))
+    if result.rowcount == 0:
+        db.session.rollback()
+        abort(404)
+    db.session.commit()
+
+    tags = {"teams", "players", f"team:{team_id}"}
+    tags.update(f"player:{player_id}" for player_id in ids)
+    response_cache.invalidate(tags)
+
+    return ids
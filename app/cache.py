@@ -0,0 +1,323 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from flask import current_app, g, request
+from .compression import (
+    cached_compression_level,
+    compress_body,
+    make_etag_weak,
+    negotiate_encoding,
+)
+
+
+class MemoryBackend:
+    """In-process LRU of cached responses with a tag index"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.expirations = 0
+
+        self._entries = OrderedDict()
+        self._tags = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, tags, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, tags, expires_at)
+            for tag in tags:
+                self._tags[tag].add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisBackend:
+    """Cache shared by every worker, kept in Redis or a local stand-in.
+
+    ``client`` only needs the ``get``, ``set``, ``sadd``, ``smembers``,
+    ``expire``, ``delete`` and ``scan_iter`` methods of a Redis client.
+    """
+
+    def __init__(self, client, ttl=300, prefix="response-cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, tags):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+        for tag in tags:
+            self.client.sadd(self._tag_key(tag), key)
+            self.client.expire(self._tag_key(tag), self.ttl)
+
+    def invalidate(self, tags):
+        keys = set()
+        for tag in tags:
+            keys.update(
+                key.decode() if isinstance(key, bytes) else key
+                for key in self.client.smembers(self._tag_key(tag))
+            )
+
+        names = [self.prefix + key for key in keys]
+        names.extend(self._tag_key(tag) for tag in tags)
+        self.client.delete(*names)
+        return len(keys)
+
+    def clear(self):
+        names = list(self.client.scan_iter(self.prefix + "*"))
+        if names:
+            self.client.delete(*names)
+
+    def stats(self):
+        # Redis evicts and expires entries on its own
+        return {"entries": None, "evictions": None, "expirations": None}
+
+
+class ResponseCache:
+    """Read-through cache of GET responses keyed by route and query args.
+
+    Entries are tagged with the players and teams they were built from and
+    dropped by the ``insert()``, ``update()`` and ``delete()`` methods of
+    the models, see ``Player.cache_tags`` and ``Team.cache_tags``.
+
+    They also keep the table versions their data was read at, and are only
+    served while the database the request reads from is still at those
+    versions. This catches writes made by other workers, responses stored
+    by a request that read before a write committed and, once it caught
+    up, responses built from a lagging replica.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.versions = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        backend = app.config.get("RESPONSE_CACHE_BACKEND", "memory")
+        ttl = app.config.get("RESPONSE_CACHE_TTL", 300)
+
+        if backend == "memory":
+            self.backend = MemoryBackend(
+                max_entries=app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 1024),
+                ttl=ttl,
+            )
+        elif backend == "redis":
+            self.backend = RedisBackend.from_url(
+                app.config["RESPONSE_CACHE_URL"], ttl=ttl
+            )
+        else:
+            self.backend = None
+
+        # Imported here, the models themselves depend on this module
+        from .database.versions import table_versions
+
+        self.versions = table_versions
+        app.extensions["response_cache"] = self
+
+    @staticmethod
+    def key():
+        args = sorted(request.args.items(multi=True))
+        return repr((request.path, args))
+
+    def get(self, key, versions=None):
+        """Entry of ``key``, unless built from other table ``versions``"""
+        if self.backend is None:
+            return None
+
+        value = self.backend.get(key)
+        if value is not None and value.get("versions") != versions:
+            self.stale += 1
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, tags):
+        if self.backend is not None:
+            self.backend.set(key, value, tags)
+
+    def invalidate(self, tags):
+        if self.backend is not None and tags:
+            self.invalidations += self.backend.invalidate(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        stats = {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "invalidations": self.invalidations,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def tag_response(*tags):
+    """Add tags to the response being built, for tags only the view knows"""
+    g.setdefault("cache_tags", set()).update(tags)
+
+
+def cached_response(*tags):
+    """Serve a GET view from the response cache.
+
+    ``tags`` are formatted with the view's arguments, e.g. "player:{id}".
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache.backend is None:
+                return view(*args, **kwargs)
+
+            key = response_cache.key()
+            # Read before the view, from the database the view reads
+            versions = response_cache.versions(
+                current_app.config.get("ETAG_VERSION_TTL", 0)
+            )
+            cached = response_cache.get(key, versions)
+            if cached is not None:
+                return cached_to_response(key, cached)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            entry_tags = {tag.format(**kwargs) for tag in tags}
+            entry_tags.update(g.get("cache_tags", ()))
+            # Only the identity body; each encoding is compressed on the
+            # first hit that asks for it and then kept with the entry
+            cached = {
+                "body": response.get_data(),
+                "mimetype": response.mimetype,
+                "etag": response.get_etag()[0],
+                "compression_level": cached_compression_level(response),
+                "encoded": {},
+                "tags": entry_tags,
+                "versions": versions,
+            }
+            response_cache.set(key, cached, entry_tags)
+            # compress_response compresses it for this request
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cached_to_response(key, cached):
+    etag = cached["etag"]
+    level = cached.get("compression_level", 0)
+    encoding = negotiate_encoding() if level else None
+
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    elif encoding is not None:
+        response = current_app.response_class(
+            encoded_body(key, cached, encoding), mimetype=cached["mimetype"]
+        )
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = current_app.response_class(
+            cached["body"], mimetype=cached["mimetype"]
+        )
+
+    if level:
+        response.vary.add("Accept-Encoding")
+    if etag is not None:
+        response.set_etag(etag)
+        if encoding is not None:
+            make_etag_weak(response)
+    return response
+
+
+def encoded_body(key, cached, encoding):
+    """Cached body in ``encoding``, compressed and stored on first use"""
+    body = cached["encoded"].get(encoding)
+    if body is None:
+        body = compress_body(
+            cached["body"], encoding, cached["compression_level"]
+        )
+        cached["encoded"][encoding] = body
+        response_cache.set(key, cached, cached["tags"])
+    return body
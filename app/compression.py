@@ -0,0 +1,153 @@
+import zlib
+from functools import partial
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional, only gzip is offered without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/csv",
+)
+
+
+def compression_level(level):
+    """Set the compression level of a route, 0 turns compression off.
+
+    Goes below ``@app.route``; the level is used as the gzip level and as
+    the brotli quality.
+    """
+
+    def decorator(view):
+        view.compression_level = level
+        return view
+
+    return decorator
+
+
+def available_encodings():
+    # In order of preference when the client accepts both equally
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding():
+    """Best content coding in Accept-Encoding, None for identity"""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def route_compression_level():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(
+        view, "compression_level", current_app.config["COMPRESSION_LEVEL"]
+    )
+
+
+def compress_body(body, encoding, level):
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+
+    compressor = gzip_compressor(level)
+    return compressor.compress(body) + compressor.flush()
+
+
+def gzip_compressor(level):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress a streamed body chunk by chunk.
+
+    Every chunk is flushed so clients receive data as it is produced
+    rather than when the compressor's window fills up.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        flush, finish = compressor.flush, compressor.finish
+        compress = compressor.process
+    else:
+        compressor = gzip_compressor(level)
+        compress = compressor.compress
+        flush = partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compress(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def should_compress(response, level):
+    return (
+        level > 0
+        and response.status_code == 200
+        and "Content-Encoding" not in response.headers
+        and not response.direct_passthrough
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and (
+            response.is_streamed
+            or response.content_length is None
+            or response.content_length
+            >= current_app.config["COMPRESSION_MIN_SIZE"]
+        )
+    )
+
+
+def compress_response(response):
+    """after_request hook compressing responses the client accepts"""
+    level = route_compression_level()
+    if not should_compress(response, level):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(compress_body(response.get_data(), encoding, level))
+
+    response.headers["Content-Encoding"] = encoding
+    make_etag_weak(response)
+    return response
+
+
+def make_etag_weak(response):
+    # The compressed bytes differ from the identity body, so the ETag can
+    # only promise the same content, which If-None-Match compares weakly
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def cached_compression_level(response):
+    """Level the response cache compresses this response at, 0 for none"""
+    level = route_compression_level()
+    if not current_app.config["COMPRESSION_ENABLED"] or not should_compress(
+        response, level
+    ):
+        return 0
+    return level
+
+
+def init_compression(app):
+    app.config.setdefault("COMPRESSION_ENABLED", True)
+    app.config.setdefault("COMPRESSION_LEVEL", 6)
+    app.config.setdefault("COMPRESSION_MIN_SIZE", 1024)
+
+    if app.config["COMPRESSION_ENABLED"]:
+        app.after_request(compress_response)
@@ -0,0 +1,167 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import func
+from .database.models import db, Player, Team
+from .database.versions import table_versions
+
+ROW_ETAG_MEMO_SIZE = 10000
+
+
+class RowETagMemo:
+    """ETags of single rows, valid while the table versions are unchanged"""
+
+    def __init__(self, max_size=ROW_ETAG_MEMO_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != versions:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, versions, etag):
+        with self._lock:
+            self._entries[key] = (versions, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+row_etags = RowETagMemo()
+
+
+def current_versions():
+    return table_versions(current_app.config.get("ETAG_VERSION_TTL", 0))
+
+
+def player_etag(player_id, version, team=False, team_version=None):
+    # A player's team name is part of its representation when shown
+    etag = f"player-{player_id}-v{version}-t"
+    if team:
+        etag += str(team_version or 0)
+    return etag
+
+
+def team_etag(team_id, version, roster=None):
+    """ETag of a team, and of its roster unless ``roster`` is None.
+
+    The roster is summed up by its player count and the sums of their
+    versions and ids, which every insert, update, move or delete of one
+    of its players changes; writes to other teams' players do not.
+    """
+    etag = f"team-{team_id}-v{version}-r"
+    if roster is not None:
+        etag += "{}.{}.{}".format(*roster)
+    return etag
+
+
+def listing_etag(versions):
+    args = sorted(request.args.items(multi=True))
+    key = repr((request.path, args, versions)).encode()
+    return hashlib.sha1(key).hexdigest()
+
+
+def is_not_modified(etag):
+    # Weak comparison, so ETags weakened by compression still match
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def if_match_versions(kind, row_id):
+    """Row versions the request's If-Match ETags were issued for.
+
+    None without If-Match or with ``*``. ETags of another row are ignored,
+    so an If-Match naming only those gives an empty set and fails.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+
+    pattern = re.compile(rf"{kind}-{row_id}-v(\d+)-")
+    return {
+        int(match.group(1))
+        for match in map(
+            pattern.match, request.if_match.as_set(include_weak=True)
+        )
+        if match
+    }
+
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def known_player_etag(player_id, versions, team=True):
+    """ETag of a player without loading and serializing the player.
+
+    ``team`` tells whether the team is shown. Returns None when the player
+    does not exist.
+    """
+    key = ("player", player_id, team)
+    etag = row_etags.get(key, versions)
+    if etag is not None:
+        return etag
+
+    query = db.session.query(Player.version).filter(Player.id == player_id)
+    if team:
+        query = query.outerjoin(Team, Player.team_id == Team.id).add_columns(
+            Team.version
+        )
+    row = query.one_or_none()
+    if row is None:
+        return None
+
+    etag = player_etag(player_id, row[0], team, *row[1:])
+    row_etags.put(key, versions, etag)
+    return etag
+
+
+def known_team_etag(team_id, versions, roster=True):
+    key = ("team", team_id, roster)
+    etag = row_etags.get(key, versions)
+    if etag is not None:
+        return etag
+
+    query = db.session.query(Team.version).filter(Team.id == team_id)
+    if roster:
+        query = (
+            query.outerjoin(Player, Player.team_id == Team.id)
+            .group_by(Team.id, Team.version)
+            .add_columns(
+                func.count(Player.id),
+                func.coalesce(func.sum(Player.version), 0),
+                func.coalesce(func.sum(Player.id), 0),
+            )
+        )
+    row = query.one_or_none()
+    if row is None:
+        return None
+
+    etag = team_etag(team_id, row[0], row[1:] if roster else None)
+    row_etags.put(key, versions, etag)
+    return etag
+
+
+def conditional_listing(view):
+    """Answer a listing with 304 when no tracked table has changed"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = listing_etag(current_versions())
+        if is_not_modified(etag):
+            return not_modified(etag)
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+
+    return wrapper
@@ -0,0 +1,53 @@
+from flask import current_app
+from sqlalchemy import text
+from .database.models import db
+from .database.versions import row_count
+
+COUNT_STRATEGIES = ("exact", "cached", "estimate")
+
+
+def init_counts(app):
+    strategy = app.config.setdefault("COUNT_STRATEGY", "exact")
+    if strategy not in COUNT_STRATEGIES:
+        raise ValueError(f"Unknown COUNT_STRATEGY {strategy!r}")
+
+
+def estimated_row_count(table_name):
+    """Row count from the Postgres planner statistics, None elsewhere"""
+    if db.engine.dialect.name != "postgresql":
+        return None
+
+    estimate = db.session.execute(
+        text(
+            "SELECT reltuples FROM pg_class"
+            " WHERE oid = CAST(:table_name AS regclass)"
+        ),
+        {"table_name": table_name},
+    ).scalar()
+    # -1 (or 0 before Postgres 14) until the table is vacuumed or analyzed
+    if estimate is None or estimate <= 0:
+        return None
+    return int(estimate)
+
+
+def count_total(model, query, filtered=False):
+    """Total for a listing and the strategy that produced it.
+
+    ``COUNT_STRATEGY`` picks "exact" (COUNT(*) on every request), "cached"
+    (the row count kept in table_version) or "estimate" (Postgres planner
+    statistics). Filtered listings, and strategies that have no count to
+    give, fall back to an exact count.
+    """
+    strategy = current_app.config["COUNT_STRATEGY"]
+
+    if not filtered:
+        total = None
+        if strategy == "cached":
+            total = row_count(model.__tablename__)
+        elif strategy == "estimate":
+            total = estimated_row_count(model.__tablename__)
+
+        if total is not None:
+            return total, strategy
+
+    return query.order_by(None).count(), "exact"
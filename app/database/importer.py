@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+import time
+from sqlalchemy import select
+from ..bulk import PLAYER_FIELDS, TEAM_FIELDS, validate_item
+from ..cache import response_cache
+from .models import db, Player, Team
+from .versions import record_write
+
+IMPORT_BATCH_SIZE = 5000
+
+
+class InvalidImportRow(ValueError):
+    """A row of an import file that cannot be loaded"""
+
+    def __init__(self, path, line, errors):
+        super().__init__("{}:{}: {}".format(path, line, "; ".join(errors)))
+        self.path = path
+        self.line = line
+        self.errors = errors
+
+
+def read_records(path):
+    """Yield (line number, record) from a CSV file or an NDJSON file.
+
+    Files ending in ``.csv`` are read as CSV with a header row, anything
+    else as one JSON object per line.
+    """
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                raise InvalidImportRow(path, line_number, ["invalid JSON"])
+
+
+def coerce_record(record, table, fields):
+    """Turn strings, as CSV gives every value, into the column types"""
+    if not isinstance(record, dict):
+        return record
+
+    values = {}
+    for name in fields:
+        value = record.get(name)
+        if value == "":
+            value = None
+        elif isinstance(value, str):
+            if table.c[name].type.python_type is int:
+                try:
+                    value = int(value)
+                except ValueError:
+                    pass
+        values[name] = value
+    return values
+
+
+def team_ids():
+    return {team_id for team_id, in db.session.query(Team.id)}
+
+
+def copy_value(value):
+    # COPY's text format: \N is NULL, backslashes and separators escaped
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(table, columns, rows):
+    """Load rows with COPY FROM STDIN on the session's Postgres connection"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(row[name]) for name in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    connection = db.session.connection()
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY {} ({}) FROM STDIN".format(table.name, ", ".join(columns)),
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+    # COPY bypasses SQLAlchemy, so the table version is bumped by hand
+    record_write(connection, table.name, len(rows))
+
+
+def insert_batch(table, columns, rows):
+    if db.engine.dialect.name == "postgresql":
+        copy_rows(table, columns, rows)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def insert_returning_ids(table, rows):
+    """Insert rows and return the (id, name) of each new row"""
+    if db.engine.dialect.name == "postgresql":
+        return db.session.execute(
+            table.insert().values(rows).returning(table.c.id, table.c.name)
+        ).fetchall()
+    return [
+        (
+            db.session.execute(table.insert(), row).inserted_primary_key[0],
+            row["name"],
+        )
+        for row in rows
+    ]
+
+
+def insert_teams(names):
+    """Batch insert that records the ids of the new teams in ``names``.
+
+    Team names are not unique, so a name refers to the first team of
+    that name in the import, never to a team that was already there or
+    that a concurrent import added.
+    """
+
+    def insert(table, columns, rows):
+        for team_id, name in insert_returning_ids(table, rows):
+            if name not in names or team_id < names[name]:
+                names[name] = team_id
+
+    return insert
+
+
+def numbered_records(source, name):
+    """(line, record) pairs of a file path or of an iterable of records"""
+    if isinstance(source, str):
+        return source, read_records(source)
+    return f"<{name}>", enumerate(source, 1)
+
+
+def load_records(
+    source,
+    name,
+    model,
+    fields,
+    prepare=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    insert=insert_batch,
+):
+    """Validate and insert every record, a batch at a time.
+
+    ``prepare`` can rewrite a record before validation and ``insert``
+    replaces how a batch is inserted. Raises InvalidImportRow on the first
+    record that cannot be loaded.
+    """
+    path, records = numbered_records(source, name)
+    table = model.__table__
+    batch = []
+    loaded = 0
+
+    for line, record in records:
+        if prepare is not None and isinstance(record, dict):
+            record = prepare(record, path, line)
+        row, errors = validate_item(
+            coerce_record(record, table, fields), table, fields
+        )
+        if errors:
+            raise InvalidImportRow(path, line, errors)
+
+        batch.append(row)
+        if len(batch) >= batch_size:
+            insert(table, fields, batch)
+            loaded += len(batch)
+            batch = []
+
+    if batch:
+        insert(table, fields, batch)
+        loaded += len(batch)
+
+    return loaded
+
+
+def resolve_team(team_ids, known_ids):
+    """Player records name their team by ``team`` or ``team_id``"""
+
+    def prepare(record, path, line):
+        record = dict(record)
+        name = record.pop("team", None)
+        if name:
+            if name not in team_ids:
+                raise InvalidImportRow(path, line, [f"unknown team {name!r}"])
+            record["team_id"] = team_ids[name]
+        elif record.get("team_id") not in (None, ""):
+            team_id = coerce_record(record, Player.__table__, ("team_id",))[
+                "team_id"
+            ]
+            if not isinstance(team_id, int) or isinstance(team_id, bool):
+                error = "team_id must be an integer"
+            elif team_id not in known_ids:
+                error = "team_id does not exist"
+            else:
+                return record
+            raise InvalidImportRow(path, line, [error])
+        return record
+
+    return prepare
+
+
+def drop_indexes(tables):
+    """Drop the indexes of tables that must still be empty.
+
+    On Postgres DROP INDEX locks the table against reads and writes until
+    the import commits, so this is only meant for offline loads.
+    """
+    connection = db.session.connection()
+    loaded = [
+        table.name
+        for table in tables
+        if connection.execute(select([table.c.id]).limit(1)).first()
+    ]
+    if loaded:
+        raise ValueError(
+            "Indexes are only rebuilt for empty tables, {} has rows".format(
+                ", ".join(loaded)
+            )
+        )
+
+    for table in tables:
+        for index in table.indexes:
+            index.drop(bind=connection)
+
+
+def create_indexes(tables):
+    connection = db.session.connection()
+    for table in tables:
+        for index in table.indexes:
+            index.create(bind=connection)
+        if connection.dialect.name == "postgresql":
+            # Fresh statistics for the planner and estimated counts
+            connection.execute(f"ANALYZE {table.name}")
+
+
+def import_league(
+    teams=None,
+    players=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    rebuild_indexes=False,
+):
+    """Load teams and then players from CSV or NDJSON files.
+
+    ``teams`` and ``players`` are file paths, or iterables of records
+    such as those of a SyntheticLeague. Everything is loaded in one
+    transaction, so a bad row leaves the database as it was. Players name
+    their team by ``team``, resolved in memory against the teams of the
+    same import, or by ``team_id``. With ``rebuild_indexes`` the
+    secondary indexes of the loaded tables, which must be empty, are
+    dropped first and built once at the end.
+
+    Returns the number of teams and players loaded and the load rate.
+    """
+    started = time.perf_counter()
+    tables = [
+        model.__table__
+        for model, source in ((Team, teams), (Player, players))
+        if source is not None
+    ]
+
+    try:
+        if rebuild_indexes:
+            drop_indexes(tables)
+
+        team_count = player_count = 0
+        team_names = {}
+        if teams is not None:
+            team_count = load_records(
+                teams,
+                "teams",
+                Team,
+                TEAM_FIELDS,
+                None,
+                batch_size,
+                insert_teams(team_names),
+            )
+        if players is not None:
+            player_count = load_records(
+                players,
+                "players",
+                Player,
+                PLAYER_FIELDS,
+                resolve_team(team_names, team_ids()),
+                batch_size,
+            )
+
+        if rebuild_indexes:
+            create_indexes(tables)
+        db.session.commit()
+    except:
+        db.session.rollback()
+        raise
+
+    response_cache.clear()
+
+    seconds = time.perf_counter() - started
+    rows = team_count + player_count
+    return {
+        "teams": team_count,
+        "players": player_count,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0,
+    }
@@ -1,11 +1,109 @@
-from flask_script import Manager
+from functools import partial
+from flask_script import Command, Manager
 from flask_migrate import Migrate, MigrateCommand
 
-from . import app
+from .. import create_app
+from .importer import IMPORT_BATCH_SIZE, import_league
+from .models import Player, Team
+from .synthetic import SyntheticLeague, write_league
+from .versions import refresh_row_counts, row_count
 
-manager = Manager(app)
+manager = Manager(partial(create_app, False))
 
 manager.add_command("db", MigrateCommand)
 
+
+@manager.option("--teams", help="CSV or NDJSON file of teams")
+@manager.option("--players", help="CSV or NDJSON file of players")
+@manager.option(
+    "--batch-size",
+    type=int,
+    default=IMPORT_BATCH_SIZE,
+    help="Rows sent to the database at a time",
+)
+@manager.option(
+    "--rebuild-indexes",
+    action="store_true",
+    help="Drop the indexes of the loaded tables, which must be empty, and"
+    " build them at the end; locks the tables, for offline loads only",
+)
+def load(teams=None, players=None, batch_size=None, rebuild_indexes=False):
+    """Bulk import teams and players, COPY on Postgres"""
+    result = import_league(
+        teams=teams,
+        players=players,
+        batch_size=batch_size or IMPORT_BATCH_SIZE,
+        rebuild_indexes=rebuild_indexes,
+    )
+    print(
+        "Imported {teams} teams and {players} players in {seconds:.2f}s"
+        " ({rows_per_second:.0f} rows/s)".format(**result)
+    )
+
+
+@manager.option("--teams", type=int, default=100, help="Teams to generate")
+@manager.option(
+    "--players", type=int, default=2000, help="Players to generate"
+)
+@manager.option("--seed", type=int, default=0, help="Same seed, same league")
+@manager.option(
+    "--output",
+    help="Write teams and players files to this directory instead of"
+    " loading the league into the database",
+)
+@manager.option(
+    "--format",
+    dest="file_format",
+    choices=("ndjson", "csv"),
+    default="ndjson",
+    help="Format of the files written to --output",
+)
+@manager.option(
+    "--rebuild-indexes",
+    action="store_true",
+    help="Drop the indexes of the loaded tables, which must be empty, and"
+    " build them at the end; locks the tables, for offline loads only",
+)
+def generate(
+    teams=100,
+    players=2000,
+    seed=0,
+    output=None,
+    file_format="ndjson",
+    rebuild_indexes=False,
+):
+    """Generate a synthetic league, into the database or to files"""
+    league = SyntheticLeague(teams, players, seed)
+    if output:
+        for path in write_league(league, output, file_format):
+            print(f"Wrote {path}")
+        return
+
+    result = import_league(
+        teams=league.teams(),
+        players=league.players(),
+        rebuild_indexes=rebuild_indexes,
+    )
+    print(
+        "Generated {teams} teams and {players} players in {seconds:.2f}s"
+        " ({rows_per_second:.0f} rows/s)".format(**result)
+    )
+
+
+class Recount(Command):
+    """Recount the cached totals, e.g. after writes made outside the app"""
+
+    def run(self):
+        refresh_row_counts()
+        print(
+            "Counted {} teams and {} players".format(
+                row_count(Team.__tablename__), row_count(Player.__tablename__)
+            )
+        )
+
+
+manager.add_command("recount", Recount())
+
+
 if __name__ == "__main__":
     manager.run()
@@ -1,15 +1,28 @@
+from os import path
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import Index, event, inspect
 from sqlalchemy.sql.schema import ForeignKey
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from ..cache import response_cache
+from .pool import engine_options
+from .replicas import RoutingSQLAlchemy, replica_router
 
-db = SQLAlchemy()
+MIGRATIONS_DIRECTORY = path.normpath(
+    path.join(path.dirname(__file__), "..", "..", "migrations")
+)
+
+db = RoutingSQLAlchemy()
 migrate = Migrate()
 
 
 def setup_db(app):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
     db.app = app
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIRECTORY)
+    replica_router.init_app(app)
 
 
 def db_drop_and_create_all():
@@ -17,6 +30,25 @@ def db_drop_and_create_all():
     db.create_all()
 
 
+def verify_schema_revision():
+    """Check the database is at the newest revision in migrations/"""
+    config = AlembicConfig()
+    config.set_main_option("script_location", MIGRATIONS_DIRECTORY)
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        current = set(context.get_current_heads())
+
+    if current != heads:
+        raise RuntimeError(
+            "Database schema is at revision {} but the migrations head is {},"
+            " run `flask db upgrade`".format(
+                ", ".join(sorted(current)) or "none", ", ".join(sorted(heads))
+            )
+        )
+
+
 def populate_db():
     womens_team = Team(
         name="Whiplash",
@@ -56,43 +88,66 @@ class Player(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
     gender = db.Column(db.String(6), nullable=False)
-    jersey_number = db.Column(db.Integer, nullable=False)
+    jersey_number = db.Column(db.Integer, nullable=False, index=True)
     position = db.Column(db.String(7), nullable=False)
     team_id = db.Column(db.Integer, ForeignKey("team.id"))
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default="1"
+    )
+
+    # Gender and position only narrow a roster, on their own they match a
+    # large share of the table. Both indexes lead with team_id, so they
+    # also serve roster lookups without an index of its own
+    __table_args__ = (
+        Index("ix_player_team_id_gender", "team_id", "gender"),
+        Index("ix_player_team_id_position", "team_id", "position"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+    # Keys of format(), which adds the team's name as "team"
+    FORMAT_FIELDS = ("id", "name", "gender", "jersey_number", "position")
 
     def __repr__(self):
         return "<Player {}>".format(self.name)
 
     def format(self):
-        if self.team:
-            return {
-                "id": self.id,
-                "name": self.name,
-                "gender": self.gender,
-                "jersey_number": self.jersey_number,
-                "position": self.position,
-                "team": self.team.name,
-            }
-        else:
-            return {
-                "id": self.id,
-                "name": self.name,
-                "gender": self.gender,
-                "jersey_number": self.jersey_number,
-                "position": self.position,
-                "team": "",
-            }
+        player = {field: getattr(self, field) for field in self.FORMAT_FIELDS}
+        player["team"] = self.team.name if self.team else ""
+        return player
+
+    def cache_tags(self):
+        """Tags of the cached responses that show this player"""
+        tags = {"players", "teams", f"player:{self.id}"}
+
+        # Both the previous and the new team rosters show the player
+        state = inspect(self)
+        team_ids = {self.team_id}
+        team_ids.update(state.attrs.team_id.history.deleted)
+        team_ids.update(
+            team.id
+            for team in state.attrs.team.history.sum()
+            if team is not None
+        )
+        tags.update(
+            f"team:{team_id}" for team_id in team_ids if team_id is not None
+        )
+        return tags
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate(self.cache_tags())
 
     def update(self):
+        tags = self.cache_tags()
         db.session.commit()
+        response_cache.invalidate(tags)
 
     def delete(self):
+        tags = self.cache_tags()
         db.session.delete(self)
         db.session.commit()
+        response_cache.invalidate(tags)
 
 
 class Team(db.Model):
@@ -102,30 +157,72 @@ class Team(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
     location = db.Column(db.String(64), nullable=False)
-    division = db.Column(db.String(7), nullable=False)
+    division = db.Column(db.String(7), nullable=False, index=True)
     level = db.Column(db.String(20), nullable=False)
     players = db.relationship("Player", backref="team")
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default="1"
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Keys of format(), which adds the player names as "roster"
+    FORMAT_FIELDS = ("id", "name", "location", "division", "level")
 
     def __repr__(self):
         return "<Team {}>".format(self.name)
 
-    def format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "location": self.location,
-            "division": self.division,
-            "level": self.level,
-            "roster": [player.name for player in self.players],
-        }
+    def format(self, include_roster=True):
+        team = {field: getattr(self, field) for field in self.FORMAT_FIELDS}
+        if include_roster:
+            team["roster"] = [player.name for player in self.players]
+        return team
+
+    def cache_tags(self):
+        """Tags of the cached responses that show this team or its name"""
+        return {"teams", "players", f"team:{self.id}"}
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        response_cache.invalidate(self.cache_tags())
 
     def update(self):
         db.session.commit()
+        response_cache.invalidate(self.cache_tags())
 
     def delete(self):
+        tags = self.cache_tags()
         db.session.delete(self)
         db.session.commit()
+        response_cache.invalidate(tags)
+
+
+class TableVersion(db.Model):
+    """Counter bumped after every transaction that writes to a tracked table.
+
+    The bump is a short transaction of its own, run once the write has
+    committed, and also applies the write's change to ``row_count``. The
+    count is NULL while unknown, e.g. after a write whose row count the
+    driver did not report or whose bump failed, until
+    ``refresh_row_counts()`` recounts it.
+    """
+
+    __tablename__ = "table_version"
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    row_count = db.Column(db.BigInteger)
+
+    def __repr__(self):
+        return "<TableVersion {} {}>".format(self.name, self.version)
+
+
+@event.listens_for(TableVersion.__table__, "after_create")
+def create_table_versions(target, connection, **kw):
+    connection.execute(
+        target.insert(),
+        [
+            {"name": Player.__tablename__, "version": 0, "row_count": 0},
+            {"name": Team.__tablename__, "version": 0, "row_count": 0},
+        ],
+    )
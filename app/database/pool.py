@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import weakref
+from sqlalchemy import event, exc
+from sqlalchemy.pool import Pool, QueuePool
+
+
+class PoolStats:
+    """How long requests wait to check a connection out of the pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self, pool=None):
+        stats = {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records the time spent waiting for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started, timed_out)
+
+
+def engine_options(config):
+    """SQLAlchemy engine options built from the DB_POOL_* settings.
+
+    SQLite keeps SQLAlchemy's own pool, which takes none of them.
+    """
+    uri = config.get("SQLALCHEMY_DATABASE_URI") or ""
+    options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+
+    if uri.startswith("sqlite"):
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+        pool_pre_ping=config["DB_POOL_PRE_PING"],
+    )
+
+    statement_timeout = config.get("DB_STATEMENT_TIMEOUT_MS")
+    if statement_timeout and uri.startswith("postgres"):
+        connect_args = dict(options.get("connect_args", {}))
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+        options["connect_args"] = connect_args
+
+    return options
+
+
+@event.listens_for(Pool, "connect")
+def remember_connection_pid(dbapi_connection, connection_record):
+    connection_record.info["pid"] = os.getpid()
+
+
+@event.listens_for(Pool, "checkout")
+def discard_connections_from_parent(
+    dbapi_connection, connection_record, connection_proxy
+):
+    # A connection opened before a fork shares its socket with the parent.
+    # Drop it without closing it, so the parent's session is left intact,
+    # and let the pool open a new one for this process.
+    pid = os.getpid()
+    if connection_record.info.get("pid", pid) != pid:
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError(
+            "Connection belongs to pid {}, not {}".format(
+                connection_record.info["pid"], pid
+            )
+        )
+
+
+# Engines disposed before a fork; weak, so they do not outlive their app
+engines_to_dispose = weakref.WeakSet()
+fork_hook_registered = False
+fork_hook_lock = threading.Lock()
+
+
+def dispose_engines():
+    for engine in list(engines_to_dispose):
+        engine.dispose()
+
+
+def dispose_before_fork(engine):
+    """Close the engine's pooled connections right before every fork.
+
+    With gunicorn --preload the app, and so the engine, is created in the
+    master; this keeps the master from handing its connections to workers.
+    One hook per process disposes every engine still in use.
+    """
+    global fork_hook_registered
+
+    engines_to_dispose.add(engine)
+    with fork_hook_lock:
+        if fork_hook_registered or not hasattr(os, "register_at_fork"):
+            return
+        os.register_at_fork(before=dispose_engines)
+        fork_hook_registered = True
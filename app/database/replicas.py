@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, exc, orm, text
+from sqlalchemy.sql.dml import UpdateBase
+from .pool import dispose_before_fork, engine_options
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Seconds a Postgres standby is behind; 0 on a primary or a caught up
+# standby, whose last replayed transaction can be arbitrarily old
+POSTGRES_LAG = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+    " END"
+)
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.checked_until = 0
+        self.down_until = 0
+        self.lag = None
+
+
+class ReplicaRouter:
+    """Read replicas used round-robin by read-only requests.
+
+    A replica is checked at most every ``check_interval`` seconds. One that
+    cannot be reached is skipped for ``retry_interval`` seconds, and one
+    more than ``max_lag`` seconds behind until its next check; with no
+    usable replica, reads go to the primary. A read-only request whose
+    replica fails mid-request is run again on the primary.
+    """
+
+    def __init__(self):
+        self.replicas = []
+        self.max_lag = 5
+        self.check_interval = 5
+        self.retry_interval = 30
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.max_lag = config.get("REPLICA_MAX_LAG_SECONDS", 5)
+        self.check_interval = config.get("REPLICA_CHECK_INTERVAL", 5)
+        self.retry_interval = config.get("REPLICA_RETRY_INTERVAL", 30)
+        self.configure(
+            [
+                create_engine(
+                    uri,
+                    **engine_options(dict(config, SQLALCHEMY_DATABASE_URI=uri))
+                )
+                for uri in config.get("SQLALCHEMY_REPLICA_URIS") or ()
+            ]
+        )
+
+        dispatch_request = app.dispatch_request
+
+        def dispatch_request_with_fallback():
+            try:
+                return dispatch_request()
+            except (exc.OperationalError, exc.InterfaceError) as error:
+                if not self.fail_over(error):
+                    raise
+            return dispatch_request()
+
+        app.dispatch_request = dispatch_request_with_fallback
+
+    def configure(self, engines):
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+        self.replicas = [Replica(engine) for engine in engines]
+        for replica in self.replicas:
+            dispose_before_fork(replica.engine)
+
+    def choose(self):
+        """Next usable replica engine, or None to read from the primary"""
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+
+            if self.is_usable(replica):
+                self.replica_reads += 1
+                return replica.engine
+
+        self.primary_fallbacks += 1
+        return None
+
+    def is_usable(self, replica):
+        now = time.monotonic()
+        if now < replica.down_until:
+            return False
+        if now < replica.checked_until:
+            return True
+
+        try:
+            replica.lag = measure_lag(replica.engine)
+        except exc.SQLAlchemyError as error:
+            logger.warning(
+                "Replica %s is unavailable, reading from the primary: %s",
+                replica.engine.url,
+                error,
+            )
+            replica.down_until = now + self.retry_interval
+            return False
+
+        if replica.lag > self.max_lag:
+            logger.warning(
+                "Replica %s is %.1fs behind, reading from the primary",
+                replica.engine.url,
+                replica.lag,
+            )
+            replica.down_until = now + self.check_interval
+            return False
+
+        replica.checked_until = now + self.check_interval
+        return True
+
+    def fail_over(self, error):
+        """Send the rest of a request to the primary after a replica failed.
+
+        Only read-only requests that were reading from a replica are run
+        again; the replica is skipped for ``retry_interval`` seconds.
+        """
+        engine = g.get("database_replica")
+        if engine is None or not is_read_only_request():
+            return False
+
+        logger.warning(
+            "Replica %s failed during %s %s, retrying on the primary: %s",
+            engine.url,
+            request.method,
+            request.path,
+            error,
+        )
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.down_until = time.monotonic() + self.retry_interval
+        self.primary_fallbacks += 1
+
+        current_app.extensions["sqlalchemy"].db.session.rollback()
+        g.pop("database_replica")
+        g.pop("table_versions", None)
+        g.database_primary = True
+        g.database_failed_over = True
+        return True
+
+    def stats(self):
+        return {
+            "replicas": len(self.replicas),
+            "replica_reads": self.replica_reads,
+            "primary_fallbacks": self.primary_fallbacks,
+            "lag_seconds": [replica.lag for replica in self.replicas],
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+def measure_lag(engine):
+    with engine.connect() as connection:
+        if engine.dialect.name != "postgresql":
+            connection.execute(text("SELECT 1"))
+            return 0
+        return float(connection.execute(POSTGRES_LAG).scalar() or 0)
+
+
+def is_read_only_request():
+    return has_request_context() and request.method in READ_ONLY_METHODS
+
+
+class RoutingSession(SignallingSession):
+    """Session reading from a replica during read-only requests.
+
+    Everything else uses the primary: requests that may write, flushes and
+    DML statements. Once a request has written, its later reads stay on
+    the primary so they see the write. The choice is kept in ``g``, as the
+    session can outlive a request.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if not is_read_only_request() or not replica_router.replicas:
+            return super().get_bind(mapper, clause)
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            g.database_primary = True
+        if g.get("database_primary"):
+            return super().get_bind(mapper, clause)
+
+        # Every read of the request goes to the same replica
+        engine = g.get("database_replica")
+        if engine is None:
+            engine = replica_router.choose()
+            if engine is None:
+                g.database_primary = True
+                return super().get_bind(mapper, clause)
+            g.database_replica = engine
+        return engine
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        dispose_before_fork(engine)
+        return engine
@@ -0,0 +1,223 @@
+import csv
+import json
+import os
+import random
+
+DIVISIONS = ("Open", "Womens", "Mixed")
+DIVISION_WEIGHTS = (0.45, 0.25, 0.3)
+LEVELS = ("Club", "College", "Masters", "Youth")
+LEVEL_WEIGHTS = (0.4, 0.35, 0.1, 0.15)
+POSITIONS = ("Handler", "Cutter", "Hybrid")
+POSITION_WEIGHTS = (0.35, 0.45, 0.2)
+JERSEY_NUMBERS = 100
+
+CITIES = (
+    ("Atlanta", "Georgia"),
+    ("Austin", "Texas"),
+    ("Boston", "Massachusetts"),
+    ("Chicago", "Illinois"),
+    ("Denver", "Colorado"),
+    ("Minneapolis", "Minnesota"),
+    ("Portland", "Oregon"),
+    ("Raleigh", "North Carolina"),
+    ("Richardson", "Texas"),
+    ("San Diego", "California"),
+    ("San Francisco", "California"),
+    ("Seattle", "Washington"),
+)
+MASCOTS = (
+    "Flood",
+    "Fury",
+    "Heist",
+    "Hustle",
+    "Ring",
+    "Rhino",
+    "Riot",
+    "Schwa",
+    "Sockeye",
+    "Truck Stop",
+    "Whiplash",
+    "WOOF",
+)
+FIRST_NAMES = {
+    "F": (
+        "Ada",
+        "Claire",
+        "Dana",
+        "Emily",
+        "Grace",
+        "Jade",
+        "Laura",
+        "Maya",
+        "Nora",
+        "Sarah",
+    ),
+    "M": (
+        "Ben",
+        "Carlos",
+        "David",
+        "Ethan",
+        "Jimmy",
+        "Kevin",
+        "Marcus",
+        "Noah",
+        "Ryan",
+        "Sam",
+    ),
+}
+LAST_NAMES = (
+    "Brown",
+    "Garcia",
+    "Johnson",
+    "Kim",
+    "Lee",
+    "Martin",
+    "Nguyen",
+    "Patel",
+    "Smith",
+    "Williams",
+)
+
+
+class SyntheticLeague:
+    """Deterministic league of ``teams`` teams and ``players`` players.
+
+    ``teams()`` and ``players()`` stream the records, accepted by
+    ``import_league``, and give the same league for the same seed every
+    time. Roster sizes are skewed, a few big teams and many small ones,
+    and ``free_agent_ratio`` of the players have no team. Only the roster
+    sizes are held in memory, so players can run into the millions.
+    """
+
+    def __init__(self, teams, players, seed=0, free_agent_ratio=0.05):
+        self.team_count = teams
+        self.player_count = players
+        self.seed = seed
+        if teams:
+            self.free_agents = round(players * free_agent_ratio)
+        else:
+            self.free_agents = players
+
+    def random(self, stream):
+        # One generator per stream so teams() and players() replay alike
+        return random.Random(f"{self.seed}:{stream}")
+
+    def team_names(self):
+        combinations = [
+            (city, state, mascot)
+            for city, state in CITIES
+            for mascot in MASCOTS
+        ]
+        self.random("names").shuffle(combinations)
+
+        for number in range(self.team_count):
+            city, state, mascot = combinations[number % len(combinations)]
+            name = f"{city} {mascot}"
+            # Names stay unique once every combination has been used
+            if number >= len(combinations):
+                name += " {}".format(number // len(combinations) + 1)
+            yield name, f"{city}, {state}"
+
+    def teams(self):
+        generator = self.random("teams")
+        for name, location in self.team_names():
+            yield {
+                "name": name,
+                "location": location,
+                "division": generator.choices(DIVISIONS, DIVISION_WEIGHTS)[0],
+                "level": generator.choices(LEVELS, LEVEL_WEIGHTS)[0],
+            }
+
+    def roster_sizes(self):
+        """Players per team, log-normally skewed and adding up exactly"""
+        generator = self.random("rosters")
+        weights = [
+            generator.lognormvariate(0, 0.75) for _ in range(self.team_count)
+        ]
+        rostered = self.player_count - self.free_agents
+        total = sum(weights)
+        shares = [rostered * weight / total for weight in weights]
+        sizes = [int(share) for share in shares]
+
+        # Largest remainders get the players lost to rounding down
+        remainders = sorted(
+            range(self.team_count),
+            key=lambda team: sizes[team] - shares[team],
+        )
+        for team in remainders[: rostered - sum(sizes)]:
+            sizes[team] += 1
+        return sizes
+
+    def players(self):
+        generator = self.random("players")
+        for team, size in zip(self.teams(), self.roster_sizes()):
+            for jersey_number in jersey_numbers(generator, size):
+                yield player_record(
+                    generator, team["name"], team["division"], jersey_number
+                )
+
+        for _ in range(self.free_agents):
+            yield player_record(
+                generator, None, None, generator.randrange(JERSEY_NUMBERS)
+            )
+
+
+def jersey_numbers(generator, size):
+    # Unique within a roster until a roster has more players than numbers
+    numbers = generator.sample(
+        range(JERSEY_NUMBERS), min(size, JERSEY_NUMBERS)
+    )
+    numbers.extend(
+        generator.randrange(JERSEY_NUMBERS) for _ in range(size - len(numbers))
+    )
+    return numbers
+
+
+def player_record(generator, team, division, jersey_number):
+    if division == "Womens":
+        gender = "F"
+    elif division == "Open":
+        gender = "M" if generator.random() < 0.95 else "F"
+    else:
+        gender = generator.choice(("F", "M"))
+
+    return {
+        "name": "{} {}".format(
+            generator.choice(FIRST_NAMES[gender]),
+            generator.choice(LAST_NAMES),
+        ),
+        "gender": gender,
+        "jersey_number": jersey_number,
+        "position": generator.choices(POSITIONS, POSITION_WEIGHTS)[0],
+        "team": team,
+    }
+
+
+def write_records(path, records, fields):
+    with open(path, "w", newline="") as file:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(file, fields)
+            writer.writeheader()
+            writer.writerows(records)
+            return
+
+        for record in records:
+            file.write(json.dumps(record))
+            file.write("\n")
+
+
+def write_league(league, directory, file_format="ndjson"):
+    """Write teams and players files that ``import_league`` can load"""
+    paths = (
+        os.path.join(directory, f"teams.{file_format}"),
+        os.path.join(directory, f"players.{file_format}"),
+    )
+    write_records(
+        paths[0], league.teams(), ("name", "location", "division", "level")
+    )
+    write_records(
+        paths[1],
+        league.players(),
+        ("name", "gender", "jersey_number", "position", "team"),
+    )
+    return paths
@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from collections import Counter
+from flask import g
+from sqlalchemy import event, exc, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql.dml import Delete, Insert, UpdateBase
+from ..cache import response_cache
+from .models import db, Player, Team, TableVersion
+from .replicas import is_read_only_request, replica_router
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = (Player.__tablename__, Team.__tablename__)
+
+
+class VersionCache:
+    """Last table versions read by this process.
+
+    Versions are re-read from the database once they are older than the
+    ttl passed to ``get``, and dropped as soon as this process commits a
+    write to a tracked table.
+    """
+
+    def __init__(self):
+        self._versions = None
+        self._read_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, ttl=0):
+        with self._lock:
+            versions = self._versions
+            if versions is not None and time.monotonic() - self._read_at < ttl:
+                return versions
+
+        # Always from the primary, whichever database serves the request
+        versions = read_table_versions(db.engine)
+
+        with self._lock:
+            self._versions = versions
+            self._read_at = time.monotonic()
+
+        return versions
+
+    def invalidate(self):
+        with self._lock:
+            self._versions = None
+
+
+version_cache = VersionCache()
+
+
+def read_table_versions(bind=None):
+    """(player, team) table versions read through the session"""
+    rows = dict(
+        db.session.execute(
+            select([TableVersion.name, TableVersion.version]).where(
+                TableVersion.name.in_(TRACKED_TABLES)
+            ),
+            bind=bind,
+        ).fetchall()
+    )
+    return tuple(rows.get(name, 0) for name in TRACKED_TABLES)
+
+
+def table_versions(ttl=0):
+    """(player, team) table versions of the data the request reads.
+
+    A read-only request reads them once, before its data, and from the
+    replica it reads its data from, so ETags and cached responses never
+    claim a newer version than the data they were built from.
+    """
+    if not is_read_only_request():
+        return version_cache.get(ttl)
+
+    versions = g.get("table_versions")
+    if versions is None:
+        if replica_router.replicas:
+            versions = read_table_versions()
+        else:
+            versions = version_cache.get(ttl)
+        g.table_versions = versions
+    return versions
+
+
+@event.listens_for(Engine, "after_execute")
+def record_written_tables(conn, clauseelement, multiparams, params, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+
+    table = getattr(clauseelement, "table", None)
+    if table is None or table.name not in TRACKED_TABLES:
+        return
+
+    # None marks a count the driver did not report, e.g. -1
+    rowcount = result.rowcount
+    if not isinstance(clauseelement, (Insert, Delete)):
+        delta = 0
+    elif rowcount is None or rowcount < 0:
+        delta = None
+    elif isinstance(clauseelement, Insert):
+        delta = rowcount
+    else:
+        delta = -rowcount
+
+    # Connectionless engine.execute() and statements run outside of a
+    # transaction have autocommitted; there is no commit to wait for
+    if conn.closed or not conn.in_transaction():
+        logger.info("Autocommitted write to %s, bumping its version", table)
+        with conn.engine.connect() as connection:
+            bump_or_forget(connection, {table.name}, {table.name: delta})
+        return
+
+    record_write(conn, table.name, delta)
+
+
+def record_write(conn, name, row_count_delta=0):
+    """Note a write to a tracked table, bumped at the session's commit.
+
+    For writes that bypass SQLAlchemy, such as COPY on the raw DBAPI
+    connection; a None delta makes the row count unknown.
+    """
+    conn.info.setdefault("written_tables", set()).add(name)
+    if row_count_delta == 0:
+        return
+
+    deltas = conn.info.setdefault("row_count_deltas", Counter())
+    if row_count_delta is None or deltas[name] is None:
+        deltas[name] = None
+    else:
+        deltas[name] += row_count_delta
+
+
+@event.listens_for(Engine, "rollback")
+def forget_written_tables(conn):
+    conn.info.pop("written_tables", None)
+    conn.info.pop("row_count_deltas", None)
+
+
+@event.listens_for(Pool, "reset")
+def forget_written_tables_on_checkin(dbapi_connection, connection_record):
+    connection_record.info.pop("written_tables", None)
+    connection_record.info.pop("row_count_deltas", None)
+
+
+@event.listens_for(Session, "before_commit")
+def collect_written_tables(session):
+    # Flush first so writes made by the commit's own flush are recorded
+    session.flush()
+
+    connection = session.connection()
+    written = connection.info.pop("written_tables", None)
+    deltas = connection.info.pop("row_count_deltas", {})
+    if written:
+        session.info["written_tables"] = (connection, written, deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_collected_tables(session):
+    session.info.pop("written_tables", None)
+
+
+def bump_versions(connection, written, deltas):
+    """Bump the versions and row counts of the written tables"""
+    table = TableVersion.__table__
+    with connection.begin():
+        for name in sorted(written):
+            values = {"version": TableVersion.version + 1}
+            delta = deltas.get(name, 0)
+            if delta is None:
+                values["row_count"] = None
+            elif delta:
+                values["row_count"] = TableVersion.row_count + delta
+            connection.execute(
+                table.update().where(TableVersion.name == name).values(values)
+            )
+
+
+def forget_versions(engine, written):
+    """Fallback once written data could not get its version bump.
+
+    Cached responses may have been validated against the old versions,
+    so they are all dropped, and the row counts, whose deltas are lost,
+    become unknown until ``refresh_row_counts()``.
+    """
+    response_cache.clear()
+    try:
+        with engine.begin() as connection:
+            connection.execute(
+                TableVersion.__table__.update()
+                .where(TableVersion.name.in_(sorted(written)))
+                .values(version=TableVersion.version + 1, row_count=None)
+            )
+    except exc.SQLAlchemyError:
+        logger.exception("Could not reset the versions of %s", written)
+
+
+@event.listens_for(Session, "after_commit")
+def bump_table_versions(session):
+    """Bump the versions of the written tables once the write committed.
+
+    The bump is a transaction of its own on the writer's connection, so
+    the table_version rows are only locked for one statement rather than
+    for the whole write, and readers never see a new version before the
+    data it stands for. If it fails, the cache and row counts are reset
+    and the error is raised from the commit, although the write itself
+    has been committed.
+    """
+    collected = session.info.pop("written_tables", None)
+    if collected is None:
+        return
+
+    connection, written, deltas = collected
+    bump_or_forget(connection, written, deltas)
+
+
+def bump_or_forget(connection, written, deltas):
+    try:
+        bump_versions(connection, written, deltas)
+    except exc.SQLAlchemyError:
+        logger.exception("Could not bump the versions of %s", written)
+        forget_versions(connection.engine, written)
+        raise
+    finally:
+        version_cache.invalidate()
+
+
+def row_count(name):
+    """Row count kept in table_version, or None while it is unknown"""
+    return (
+        db.session.query(TableVersion.row_count)
+        .filter(TableVersion.name == name)
+        .scalar()
+    )
+
+
+def refresh_row_counts():
+    """Recount the tracked tables, e.g. after writes made outside the app"""
+    for model in (Player, Team):
+        TableVersion.query.filter_by(name=model.__tablename__).update(
+            {"row_count": db.session.query(func.count(model.id)).scalar()},
+            synchronize_session=False,
+        )
+    db.session.commit()
@@ -0,0 +1,154 @@
+import logging
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .database.replicas import READ_ONLY_METHODS
+from .serialization import jsonify
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(statements):
+    """Declare the most SQL statements a route may run per request.
+
+    Goes below ``@app.route``. Requests over budget are logged, and
+    read-only ones fail with a 500 when ``QUERY_BUDGET_ENFORCE`` is set, as
+    it is in tests.
+    """
+
+    def decorator(view):
+        view.query_budget = statements
+        return view
+
+    return decorator
+
+
+def parameter_shape(parameters, executemany=False):
+    """Bound parameter names and types, never their values"""
+    if executemany and parameters:
+        first = parameter_shape(parameters[0])
+        return "{} x {}".format(len(parameters), first)
+    if isinstance(parameters, dict):
+        return {
+            name: type(value).__name__
+            for name, value in sorted(parameters.items())
+        }
+    if isinstance(parameters, (list, tuple)):
+        return tuple(type(value).__name__ for value in parameters)
+    return type(parameters).__name__
+
+
+def current_route():
+    if not has_request_context():
+        return "-"
+    rule = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rule}"
+
+
+class QueryDiagnostics:
+    """Slow query log, N+1 detection and per-route query budgets.
+
+    ``SLOW_QUERY_MS`` logs every statement slower than that many
+    milliseconds with its route and parameter shape. ``QUERY_DIAGNOSTICS``
+    counts the statements of each request, warns when one statement is run
+    ``N_PLUS_ONE_THRESHOLD`` times or more (a relationship loaded once per
+    row) and checks routes against their ``@query_budget``.
+    """
+
+    def __init__(self):
+        self.slow_query_seconds = None
+        self.enabled = False
+        self.enforce = False
+        self.n_plus_one_threshold = 5
+
+    def init_app(self, app):
+        slow_query_ms = app.config.get("SLOW_QUERY_MS") or 0
+        self.slow_query_seconds = slow_query_ms / 1000 or None
+        self.enabled = app.config.get("QUERY_DIAGNOSTICS", False)
+        self.enforce = app.config.get("QUERY_BUDGET_ENFORCE", False)
+        self.n_plus_one_threshold = app.config.get("N_PLUS_ONE_THRESHOLD", 5)
+
+        app.before_request(start_request)
+        app.after_request(check_request)
+        if not event.contains(Engine, "before_cursor_execute", start_timer):
+            event.listen(Engine, "before_cursor_execute", start_timer)
+            event.listen(Engine, "after_cursor_execute", record_statement)
+
+
+query_diagnostics = QueryDiagnostics()
+
+
+def start_request():
+    if query_diagnostics.enabled:
+        g.query_statements = Counter()
+
+
+def start_timer(conn, cursor, statement, parameters, context, executemany):
+    if query_diagnostics.slow_query_seconds:
+        conn.info["diagnostics_started"] = time.perf_counter()
+
+
+def record_statement(conn, cursor, statement, parameters, context, many):
+    started = conn.info.pop("diagnostics_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        if elapsed >= query_diagnostics.slow_query_seconds:
+            logger.warning(
+                "Slow query (%.1f ms) on %s: %s parameters=%s",
+                elapsed * 1000,
+                current_route(),
+                statement,
+                parameter_shape(parameters, many),
+            )
+
+    if has_request_context() and "query_statements" in g:
+        g.query_statements[statement] += 1
+
+
+def check_request(response):
+    statements = g.pop("query_statements", None)
+    if statements is None:
+        return response
+
+    route = current_route()
+    for statement, count in statements.items():
+        if count >= query_diagnostics.n_plus_one_threshold:
+            logger.warning(
+                "Possible N+1 on %s: statement run %d times: %s",
+                route,
+                count,
+                statement,
+            )
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+    total = sum(statements.values())
+    if budget is None or total <= budget:
+        return response
+
+    logger.error(
+        "%s ran %d SQL statements, over its budget of %d",
+        route,
+        total,
+        budget,
+    )
+    if not query_diagnostics.enforce:
+        return response
+    # The view ran twice, once on the replica that failed
+    if g.get("database_failed_over"):
+        return response
+    # A write has committed by now; a 500 would hide that it succeeded
+    if request.method not in READ_ONLY_METHODS:
+        return response
+
+    response = jsonify(
+        {
+            "success": False,
+            "error": 500,
+            "message": f"query budget exceeded ({total} > {budget})",
+        }
+    )
+    response.status_code = 500
+    return response
@@ -0,0 +1,142 @@
+import csv
+import io
+from itertools import groupby
+from flask import Response, request, abort, stream_with_context
+from .database.models import db, Player, Team
+from .serialization import dumps
+
+EXPORT_BATCH_SIZE = 1000
+
+# Whole tables are compressed as they stream, so favour speed over size
+EXPORT_COMPRESSION_LEVEL = 1
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+PLAYER_EXPORT_FIELDS = (
+    "id",
+    "name",
+    "gender",
+    "jersey_number",
+    "position",
+    "team_id",
+    "team",
+)
+
+TEAM_EXPORT_FIELDS = ("id", "name", "location", "division", "level", "roster")
+
+
+def negotiate_export_format():
+    """Pick the export format from ?format= or else the Accept header"""
+    requested = request.args.get("format")
+    if requested:
+        if requested not in EXPORT_FORMATS:
+            abort(400)
+        return requested
+
+    if not request.accept_mimetypes:
+        return "ndjson"
+
+    mimetype = request.accept_mimetypes.best_match(EXPORT_FORMATS.values())
+    if mimetype is None:
+        abort(406)
+
+    return next(
+        name for name, value in EXPORT_FORMATS.items() if value == mimetype
+    )
+
+
+def streamed(query):
+    # Server side cursor on Postgres, rows fetched EXPORT_BATCH_SIZE at a time
+    return query.execution_options(stream_results=True).yield_per(
+        EXPORT_BATCH_SIZE
+    )
+
+
+def player_export_rows(team_id=None, division=None):
+    query = db.session.query(
+        Player.id,
+        Player.name,
+        Player.gender,
+        Player.jersey_number,
+        Player.position,
+        Player.team_id,
+        Team.name,
+    ).outerjoin(Team, Player.team_id == Team.id)
+
+    if team_id is not None:
+        query = query.filter(Player.team_id == team_id)
+    if division is not None:
+        query = query.filter(Team.division == division)
+
+    for row in streamed(query.order_by(Player.id)):
+        player = dict(zip(PLAYER_EXPORT_FIELDS, row))
+        player["team"] = player["team"] or ""
+        yield player
+
+
+def team_export_rows(team_id=None, division=None):
+    query = db.session.query(
+        Team.id,
+        Team.name,
+        Team.location,
+        Team.division,
+        Team.level,
+        Player.name,
+    ).outerjoin(Player, Player.team_id == Team.id)
+
+    if team_id is not None:
+        query = query.filter(Team.id == team_id)
+    if division is not None:
+        query = query.filter(Team.division == division)
+
+    # Rows arrive ordered by team, so only one roster is held at a time
+    rows = streamed(query.order_by(Team.id, Player.id))
+    for _, team_rows in groupby(rows, key=lambda row: row[0]):
+        team_rows = list(team_rows)
+        team = dict(zip(TEAM_EXPORT_FIELDS, team_rows[0][:5]))
+        team["roster"] = [row[5] for row in team_rows if row[5] is not None]
+        yield team
+
+
+def encode_ndjson(rows, fields):
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) == EXPORT_BATCH_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def encode_csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+
+    for count, row in enumerate(rows, start=1):
+        if isinstance(row.get("roster"), list):
+            row["roster"] = ";".join(row["roster"])
+        writer.writerow(row)
+
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+def export_response(export_format, rows, fields):
+    body = ENCODERS[export_format](rows, fields)
+    return Response(
+        stream_with_context(body), mimetype=EXPORT_FORMATS[export_format]
+    )
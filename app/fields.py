@@ -0,0 +1,116 @@
+import hashlib
+from flask import request, abort
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, load_only
+from .database.models import Player, Team
+from .serialization import format_rows
+
+
+def column_fields(model):
+    return tuple(
+        column.key
+        for column in model.__table__.columns
+        if column.key != "version"
+    )
+
+
+PLAYER_COLUMN_FIELDS = column_fields(Player)
+TEAM_COLUMN_FIELDS = column_fields(Team)
+
+# Full player listings are read as plain rows with these columns
+PLAYER_ROW_FIELDS = Player.FORMAT_FIELDS + ("team",)
+PLAYER_ROW_COLUMNS = tuple(
+    getattr(Player, field) for field in Player.FORMAT_FIELDS
+) + (func.coalesce(Team.name, "").label("team"),)
+
+# Fields that can be asked for with ?fields=
+PLAYER_FIELDS = PLAYER_COLUMN_FIELDS + ("team",)
+TEAM_FIELDS = TEAM_COLUMN_FIELDS + ("roster",)
+
+
+def requested_fields(allowed):
+    """Fields listed in ?fields=, or None to return every default field"""
+    fields = request.args.get("fields")
+    if fields is None:
+        return None
+
+    fields = tuple(dict.fromkeys(field.strip() for field in fields.split(",")))
+    if not all(field in allowed for field in fields):
+        abort(400)
+
+    return fields
+
+
+def fields_etag_suffix(fields):
+    if fields is None:
+        return ""
+    return "-f" + hashlib.sha1(",".join(fields).encode()).hexdigest()[:8]
+
+
+def player_load_options(fields):
+    """Load only the requested columns, and the team only when asked for.
+
+    The player version behind ETags and the team id are always loaded,
+    the team version only along with the team.
+    """
+    if fields is None:
+        return [joinedload(Player.team)]
+
+    # team_id tags cached responses with the player's team
+    columns = [Player.id, Player.version, Player.team_id]
+    columns.extend(
+        getattr(Player, field)
+        for field in fields
+        if field in PLAYER_COLUMN_FIELDS and field != "team_id"
+    )
+
+    options = [load_only(*columns)]
+    if "team" in fields:
+        options.append(
+            joinedload(Player.team).load_only(Team.version, Team.name)
+        )
+    return options
+
+
+def team_load_options(fields):
+    if fields is None:
+        return []
+
+    columns = [Team.id, Team.version]
+    columns.extend(
+        getattr(Team, field) for field in fields if field in TEAM_COLUMN_FIELDS
+    )
+    return [load_only(*columns)]
+
+
+def format_player(player, fields):
+    if fields is None:
+        return player.format()
+
+    formatted = {}
+    for field in fields:
+        if field == "team":
+            formatted["team"] = player.team.name if player.team else ""
+        else:
+            formatted[field] = getattr(player, field)
+    return formatted
+
+
+def player_listing_query(fields):
+    """Query for a page of players, formatted by ``format_players``.
+
+    Without ?fields= the players are read as row tuples, skipping the ORM
+    identity map and attribute instrumentation, otherwise as partially
+    loaded players.
+    """
+    if fields is None:
+        return Player.query.outerjoin(Player.team).with_entities(
+            *PLAYER_ROW_COLUMNS
+        )
+    return Player.query.options(*player_load_options(fields))
+
+
+def format_players(players, fields):
+    if fields is None:
+        return format_rows(PLAYER_ROW_FIELDS, players)
+    return [format_player(player, fields) for player in players]
@@ -0,0 +1,54 @@
+from flask import request, abort
+from .database.models import db, Player, Team
+
+PLAYER_FILTERS = {
+    "team_id": int,
+    "position": str,
+    "gender": str,
+    "jersey_number": int,
+}
+
+
+def integer_arg(name):
+    """Integer query string argument, None when absent and 400 when bad"""
+    if name not in request.args:
+        return None
+
+    value = request.args.get(name, type=int)
+    if value is None:
+        abort(400)
+    return value
+
+
+def player_filters():
+    """Criteria for the player filters in the query string.
+
+    Filters on team_id, position, gender, jersey_number and the team's
+    division are combined into a single query; ``team_id=none`` matches
+    players without a team.
+    """
+    criteria = []
+
+    for name, value_type in PLAYER_FILTERS.items():
+        if name not in request.args:
+            continue
+
+        column = getattr(Player, name)
+        if name == "team_id" and request.args[name].lower() == "none":
+            criteria.append(column.is_(None))
+            continue
+
+        value = request.args.get(name, type=value_type)
+        if value is None:
+            abort(400)
+        criteria.append(column == value)
+
+    division = request.args.get("division")
+    if division is not None:
+        criteria.append(
+            Player.team_id.in_(
+                db.session.query(Team.id).filter(Team.division == division)
+            )
+        )
+
+    return criteria
@@ -0,0 +1,303 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .cache import response_cache
+from .database.models import db
+from .database.pool import pool_stats
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = (
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.type = "counter"
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.type = "histogram"
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._series.items()
+            )
+
+        for label_values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = format_labels(
+                    self.labels + ("le",),
+                    label_values + (format_value(bound),),
+                )
+                yield self.name + "_bucket", labels, cumulative
+            labels = format_labels(self.labels, label_values)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, cumulative
+
+
+class Gauge:
+    """Value read when scraped.
+
+    ``collect()`` returns a number, or a dict of label value tuples to
+    numbers; None values are left out.
+    """
+
+    def __init__(self, name, help, collect, labels=(), type="gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.type = type
+        self.collect = collect
+
+    def samples(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                yield self.name, format_labels(
+                    self.labels, label_values
+                ), value
+
+
+class Metrics:
+    """Process-wide metrics rendered in the Prometheus text format.
+
+    Nothing is recorded unless ``METRICS_ENABLED`` is set. Every worker
+    process keeps its own metrics, scrape each worker separately.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics = []
+
+        self.requests = self.add(
+            Counter(
+                "http_requests_total",
+                "Requests handled by route, method and status",
+                labels=("route", "method", "status"),
+            )
+        )
+        self.request_duration = self.add(
+            Histogram(
+                "http_request_duration_seconds",
+                "Time to build each response, by route",
+                labels=("route", "method"),
+            )
+        )
+        self.request_statements = self.add(
+            Histogram(
+                "http_request_sql_statements",
+                "SQL statements executed per request, by route",
+                buckets=STATEMENT_BUCKETS,
+                labels=("route", "method"),
+            )
+        )
+        self.statement_duration = self.add(
+            Histogram(
+                "db_statement_duration_seconds",
+                "Time spent executing each SQL statement",
+            )
+        )
+        self.jwt_verify_duration = self.add(
+            Histogram(
+                "auth_jwt_verify_seconds",
+                "Time to verify a bearer token, including JWKS lookups",
+            )
+        )
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app):
+        # The hooks return straight away while metrics are disabled
+        self.enabled = app.config.get("METRICS_ENABLED", False)
+        app.before_request(start_request_timer)
+        app.after_request(record_request)
+        if not event.contains(Engine, "before_cursor_execute", start_timer):
+            event.listen(Engine, "before_cursor_execute", start_timer)
+            event.listen(Engine, "after_cursor_execute", record_statement)
+
+
+metrics = Metrics()
+
+
+def start_request_timer():
+    if not metrics.enabled:
+        return
+
+    g.metrics_started = time.perf_counter()
+    g.metrics_statements = 0
+
+
+def record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.requests.inc(1, route, request.method, str(response.status_code))
+    metrics.request_duration.observe(
+        time.perf_counter() - started, route, request.method
+    )
+    metrics.request_statements.observe(
+        g.pop("metrics_statements", 0), route, request.method
+    )
+    return response
+
+
+def start_timer(conn, cursor, statement, parameters, context, executemany):
+    if metrics.enabled:
+        conn.info["metrics_started"] = time.perf_counter()
+
+
+def record_statement(conn, cursor, statement, parameters, context, many):
+    started = conn.info.pop("metrics_started", None)
+    if started is None or not metrics.enabled:
+        return
+
+    metrics.statement_duration.observe(time.perf_counter() - started)
+    if has_request_context() and "metrics_statements" in g:
+        g.metrics_statements += 1
+
+
+def counters(stats, *names):
+    return lambda: {(name,): stats()[name] for name in names}
+
+
+metrics.add(
+    Gauge(
+        "response_cache_events_total",
+        "Response cache hits, misses, stale and invalidated entries",
+        counters(
+            response_cache.stats, "hits", "misses", "stale", "invalidations"
+        ),
+        labels=("event",),
+        type="counter",
+    )
+)
+metrics.add(
+    Gauge(
+        "response_cache_entries",
+        "Entries in the in-process response cache",
+        lambda: response_cache.stats().get("entries"),
+    )
+)
+metrics.add(
+    Gauge(
+        "db_pool_checkouts_total",
+        "Connections checked out of the pool, and checkouts that timed out",
+        counters(pool_stats.snapshot, "checkouts", "timeouts"),
+        labels=("event",),
+        type="counter",
+    )
+)
+metrics.add(
+    Gauge(
+        "db_pool_wait_seconds_total",
+        "Time spent waiting for a pooled connection",
+        lambda: pool_stats.wait_seconds_total,
+        type="counter",
+    )
+)
+metrics.add(
+    Gauge(
+        "db_pool_connections",
+        "Pool size and connections checked out or opened as overflow",
+        lambda: {
+            (name,): value
+            for name, value in pool_stats.snapshot(db.engine.pool).items()
+            if name in ("size", "checked_out", "overflow")
+        },
+        labels=("state",),
+    )
+)
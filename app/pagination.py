@@ -0,0 +1,62 @@
+import base64
+import binascii
+from flask import request, abort
+
+ENTRIES_PER_PAGE = 20
+MAX_ENTRIES_PER_PAGE = 100
+
+
+def encode_cursor(last_id):
+    encoded = base64.urlsafe_b64encode(str(last_id).encode())
+    return encoded.decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400)
+
+
+def is_cursor_request():
+    """Cursor mode is opted into with ?after= or ?limit="""
+    return "after" in request.args or "limit" in request.args
+
+
+def with_total_requested():
+    return request.args.get("with_total", "0").lower() in ("1", "true")
+
+
+def page_limit():
+    limit = request.args.get("limit", ENTRIES_PER_PAGE, type=int)
+    return max(1, min(limit, MAX_ENTRIES_PER_PAGE))
+
+
+def offset_paginate(query, page, per_page=ENTRIES_PER_PAGE):
+    """Items of a numbered page, counted separately with ``count_total``"""
+    if page < 1:
+        abort(404)
+    return query.limit(per_page).offset((page - 1) * per_page).all()
+
+
+def keyset_paginate(query, column):
+    """Seek past the ?after= cursor on ``column`` instead of using OFFSET.
+
+    Returns the page items and the cursor of the next page, which is None
+    when there are no more items.
+    """
+    limit = page_limit()
+    after = request.args.get("after")
+
+    if after:
+        query = query.filter(column > decode_cursor(after))
+
+    items = query.order_by(column).limit(limit + 1).all()
+    next_cursor = None
+
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(getattr(items[-1], column.key))
+
+    return items, next_cursor
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from flask import request, abort
+from sqlalchemy import func
+from .database.models import db, Player
+
+ROSTER_MODES = ("names", "count", "none")
+
+
+def roster_mode():
+    mode = request.args.get("roster", "names")
+    if mode not in ROSTER_MODES:
+        abort(400)
+    return mode
+
+
+def roster_names(team_ids):
+    """Player names per team, read as plain columns rather than ORM rows"""
+    rosters = defaultdict(list)
+    if team_ids:
+        rows = (
+            db.session.query(Player.team_id, Player.name)
+            .filter(Player.team_id.in_(team_ids))
+            .order_by(Player.id)
+        )
+        for team_id, name in rows:
+            rosters[team_id].append(name)
+    return rosters
+
+
+def roster_counts(team_ids):
+    counts = defaultdict(int)
+    if team_ids:
+        rows = (
+            db.session.query(Player.team_id, func.count(Player.id))
+            .filter(Player.team_id.in_(team_ids))
+            .group_by(Player.team_id)
+        )
+        counts.update(rows)
+    return counts
+
+
+def format_teams(teams, mode, fields=None):
+    """Format teams with their roster as names, a count or left out.
+
+    ``fields`` limits the team columns to those asked for with ?fields=.
+    """
+    if fields is None:
+        formatted = [team.format(include_roster=False) for team in teams]
+    else:
+        formatted = [
+            {
+                field: getattr(team, field)
+                for field in fields
+                if field != "roster"
+            }
+            for team in teams
+        ]
+    team_ids = [team.id for team in teams]
+
+    if mode == "names":
+        rosters = roster_names(team_ids)
+        for team_id, team in zip(team_ids, formatted):
+            team["roster"] = rosters[team_id]
+    elif mode == "count":
+        counts = roster_counts(team_ids)
+        for team_id, team in zip(team_ids, formatted):
+            team["roster_count"] = counts[team_id]
+
+    return formatted
@@ -1,10 +1,79 @@
-from flask import request, jsonify, abort
+from flask import request, abort
 from datetime import datetime as dt
 from flask import current_app as app
+from werkzeug.exceptions import HTTPException
+from .cache import cached_response, response_cache, tag_response
+from .compression import compression_level
+from .counts import count_total
+from .conditional import (
+    conditional_listing,
+    current_versions,
+    if_match_versions,
+    is_not_modified,
+    known_player_etag,
+    known_team_etag,
+    not_modified,
+    player_etag,
+)
 from .database.models import db, Player, Team
+from .database.pool import pool_stats
+from .database.replicas import replica_router
 from .auth.auth import AuthError, requires_auth
-
-ENTRIES_PER_PAGE = 20
+from .bulk import (
+    bulk_create_players,
+    bulk_create_teams,
+    bulk_delete_players,
+    bulk_delete_team,
+    bulk_update_players,
+    parse_bulk_items,
+)
+from .export import (
+    EXPORT_COMPRESSION_LEVEL,
+    PLAYER_EXPORT_FIELDS,
+    TEAM_EXPORT_FIELDS,
+    export_response,
+    negotiate_export_format,
+    player_export_rows,
+    team_export_rows,
+)
+from .fields import (
+    PLAYER_FIELDS,
+    TEAM_FIELDS,
+    fields_etag_suffix,
+    format_player,
+    format_players,
+    player_listing_query,
+    player_load_options,
+    requested_fields,
+    team_load_options,
+)
+from .diagnostics import query_budget
+from .filters import integer_arg, player_filters
+from .metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from .rosters import format_teams, roster_mode
+from .serialization import jsonify
+from .updates import update_player, update_team
+from .pagination import (
+    is_cursor_request,
+    keyset_paginate,
+    offset_paginate,
+    with_total_requested,
+)
+
+
+def players_with_team(fields=None):
+    # Each player's team is fetched in the same query by a LEFT OUTER JOIN
+    return Player.query.options(*player_load_options(fields))
+
+
+def teams_with_fields(fields=None):
+    return Team.query.options(*team_load_options(fields))
+
+
+def team_roster_mode(fields):
+    # Rosters are only built when ?fields= leaves them in
+    mode = roster_mode()
+    return mode if fields is None or "roster" in fields else "none"
 
 
 @app.route("/")
@@ -13,23 +82,51 @@ def index():
 
 
 @app.route("/players", methods=["GET"])
+@query_budget(3)
+@cached_response("players")
+@conditional_listing
 def players():
     if request.method == "GET":
+        criteria = player_filters()
+        fields = requested_fields(PLAYER_FIELDS)
+
+        if is_cursor_request():
+            player_items, next_cursor = keyset_paginate(
+                player_listing_query(fields).filter(*criteria), Player.id
+            )
+            response = {
+                "success": True,
+                "players": format_players(player_items, fields),
+                "next_cursor": next_cursor,
+            }
+            if with_total_requested():
+                (
+                    response["total_players"],
+                    response["count_strategy"],
+                ) = count_total(
+                    Player, Player.query.filter(*criteria), bool(criteria)
+                )
+
+            return jsonify(response)
+
         page = request.args.get("page", 1, type=int)
-        player_query = Player.query.paginate(
-            page=page, per_page=ENTRIES_PER_PAGE
+        player_items = offset_paginate(
+            player_listing_query(fields).filter(*criteria), page
         )
-        players_total = player_query.total
 
-        if players_total == 0 or player_query == 0:
+        if not player_items:
             abort(404)
 
-        players = [player.format() for player in player_query.items]
+        players_total, count_strategy = count_total(
+            Player, Player.query.filter(*criteria), bool(criteria)
+        )
+        players = format_players(player_items, fields)
 
         return jsonify(
             {
                 "success": True,
                 "total_players": players_total,
+                "count_strategy": count_strategy,
                 "players": players,
             }
         )
@@ -37,7 +134,23 @@ def players():
         abort(405)
 
 
+@app.route("/players/export", methods=["GET"])
+@compression_level(EXPORT_COMPRESSION_LEVEL)
+def export_players():
+    if request.method == "GET":
+        export_format = negotiate_export_format()
+        rows = player_export_rows(
+            team_id=integer_arg("team_id"),
+            division=request.args.get("division"),
+        )
+
+        return export_response(export_format, rows, PLAYER_EXPORT_FIELDS)
+    else:
+        abort(405)
+
+
 @app.route("/players", methods=["POST"])
+@query_budget(6)
 @requires_auth("create:players")
 def new_player(jwt):
     if request.method == "POST":
@@ -72,57 +185,141 @@ def new_player(jwt):
         abort(405)
 
 
+@app.route("/players/bulk", methods=["POST"])
+@requires_auth("create:players")
+def new_players_bulk(jwt):
+    if request.method == "POST":
+        items = parse_bulk_items("players")
+        atomic = request.args.get("atomic", "0").lower() in ("1", "true")
+        try:
+            result = bulk_create_players(items, atomic=atomic)
+        except:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify(result), 200 if result["created"] else 422
+    else:
+        abort(405)
+
+
+@app.route("/players/bulk", methods=["PATCH"])
+@requires_auth("update:players")
+def update_players_bulk(jwt):
+    if request.method == "PATCH":
+        body = request.get_json(silent=True)
+        try:
+            updated = bulk_update_players(body)
+        except HTTPException:
+            raise
+        except:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify(
+            {
+                "success": True,
+                "updated": updated,
+                "total_updated": len(updated),
+            }
+        )
+    else:
+        abort(405)
+
+
+@app.route("/players/bulk", methods=["DELETE"])
+@requires_auth("delete:players")
+def delete_players_bulk(jwt):
+    if request.method == "DELETE":
+        body = request.get_json(silent=True)
+        try:
+            deleted = bulk_delete_players(body)
+        except HTTPException:
+            raise
+        except:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify(
+            {
+                "success": True,
+                "deleted": deleted,
+                "total_deleted": len(deleted),
+            }
+        )
+    else:
+        abort(405)
+
+
 @app.route("/players/<int:player_id>", methods=["GET"])
+@query_budget(3)
+@cached_response("player:{player_id}")
 def player_details(player_id):
     if request.method == "GET":
-        player = Player.query.filter_by(id=player_id).one_or_none()
+        fields = requested_fields(PLAYER_FIELDS)
+        suffix = fields_etag_suffix(fields)
+        team = fields is None or "team" in fields
+
+        if request.if_none_match:
+            etag = known_player_etag(player_id, current_versions(), team)
+            if etag is not None and is_not_modified(etag + suffix):
+                return not_modified(etag + suffix)
+
+        player = (
+            players_with_team(fields).filter_by(id=player_id).one_or_none()
+        )
 
         if player is None:
             abort(404)
 
-        return jsonify({"success": True, "player": player.format()})
+        tag_response(f"team:{player.team_id}")
+        response = jsonify(
+            {"success": True, "player": format_player(player, fields)}
+        )
+        etag = player_etag(
+            player.id,
+            player.version,
+            team,
+            player.team.version if team and player.team else None,
+        )
+        response.set_etag(etag + suffix)
+        return response
     else:
         abort(405)
 
 
 @app.route("/players/<int:player_id>", methods=["PATCH"])
+@query_budget(3)
 @requires_auth("update:players")
 def update_player_details(jwt, player_id):
     if request.method == "PATCH":
-        player = Player.query.filter_by(id=player_id).one_or_none()
-        if player is None:
-            abort(404)
-        previous_player_info = player.format()
-        body = request.get_json()
-        player.name = body.get("name")
-        player.gender = body.get("gender")
-        player.jersey_number = body.get("jersey_number")
-        player.position = body.get("position")
-        team_id = body.get("team_id", None)
+        versions = if_match_versions("player", player_id)
+        body = request.get_json(silent=True)
         try:
-            player.team = (
-                Team.query.filter_by(id=team_id).one_or_none()
-                if team_id
-                else None
-            )
-
-            player.update()
-
-            return jsonify(
-                {
-                    "success": True,
-                    "new_player_info": player.format(),
-                    "previous_player_info": previous_player_info,
-                }
+            previous_player_info, new_player_info, etag = update_player(
+                player_id, body, versions
             )
+        except HTTPException:
+            raise
         except:
             db.session.rollback()
             abort(422)
+
+        response = jsonify(
+            {
+                "success": True,
+                "new_player_info": new_player_info,
+                "previous_player_info": previous_player_info,
+            }
+        )
+        # The ETag of GET /players/<id>, to chain If-Match updates
+        response.set_etag(etag)
+        return response
     else:
         abort(405)
 
 
 @app.route("/players/<int:player_id>", methods=["DELETE"])
+@query_budget(4)
 @requires_auth("delete:players")
 def delete_player(jwt, player_id):
     if request.method == "DELETE":
@@ -142,26 +339,70 @@ def delete_player(jwt, player_id):
 
 
 @app.route("/teams", methods=["GET"])
+@query_budget(4)
+@cached_response("teams")
+@conditional_listing
 def teams():
     if request.method == "GET":
+        fields = requested_fields(TEAM_FIELDS)
+        mode = team_roster_mode(fields)
+
+        if is_cursor_request():
+            team_items, next_cursor = keyset_paginate(
+                teams_with_fields(fields), Team.id
+            )
+            response = {
+                "success": True,
+                "teams": format_teams(team_items, mode, fields),
+                "next_cursor": next_cursor,
+            }
+            if with_total_requested():
+                (
+                    response["total_teams"],
+                    response["count_strategy"],
+                ) = count_total(Team, Team.query)
+
+            return jsonify(response)
+
         page = request.args.get("page", 1, type=int)
-        team_query = Team.query.paginate(page=page, per_page=ENTRIES_PER_PAGE)
-        teams_total = team_query.total
+        team_items = offset_paginate(teams_with_fields(fields), page)
 
-        if teams_total == 0:
+        if not team_items:
             abort(404)
 
-        teams = [team.format() for team in team_query.items]
+        teams_total, count_strategy = count_total(Team, Team.query)
+        teams = format_teams(team_items, mode, fields)
 
         return jsonify(
-            {"success": True, "total_teams": teams_total, "teams": teams}
+            {
+                "success": True,
+                "total_teams": teams_total,
+                "count_strategy": count_strategy,
+                "teams": teams,
+            }
         )
 
     else:
         abort(405)
 
 
+@app.route("/teams/export", methods=["GET"])
+@compression_level(EXPORT_COMPRESSION_LEVEL)
+def export_teams():
+    if request.method == "GET":
+        export_format = negotiate_export_format()
+        rows = team_export_rows(
+            team_id=integer_arg("team_id"),
+            division=request.args.get("division"),
+        )
+
+        return export_response(export_format, rows, TEAM_EXPORT_FIELDS)
+    else:
+        abort(405)
+
+
 @app.route("/teams", methods=["POST"])
+@query_budget(5)
 @requires_auth("create:teams")
 def new_team(jwt):
     if request.method == "POST":
@@ -186,69 +427,175 @@ def new_team(jwt):
         abort(405)
 
 
+@app.route("/teams/bulk", methods=["POST"])
+@requires_auth("create:teams")
+def new_teams_bulk(jwt):
+    if request.method == "POST":
+        items = parse_bulk_items("teams")
+        atomic = request.args.get("atomic", "0").lower() in ("1", "true")
+        try:
+            result = bulk_create_teams(items, atomic=atomic)
+        except:
+            db.session.rollback()
+            abort(422)
+
+        return jsonify(result), 200 if result["created"] else 422
+    else:
+        abort(405)
+
+
 @app.route("/teams/<int:team_id>", methods=["GET"])
+@query_budget(4)
+@cached_response("team:{team_id}")
 def team_details(team_id):
     if request.method == "GET":
-        team = Team.query.filter_by(id=team_id).one_or_none()
+        fields = requested_fields(TEAM_FIELDS)
+        mode = team_roster_mode(fields)
+        suffix = f"-{mode}{fields_etag_suffix(fields)}"
+
+        # Read before the team, so a concurrent write can only make the
+        # ETag older than the body and never the other way round
+        etag = known_team_etag(team_id, current_versions(), mode != "none")
+        if etag is None:
+            abort(404)
+        if is_not_modified(etag + suffix):
+            return not_modified(etag + suffix)
+
+        team = teams_with_fields(fields).filter_by(id=team_id).one_or_none()
 
         if team is None:
             abort(404)
 
-        return jsonify({"success": True, "team": team.format()})
+        response = jsonify(
+            {"success": True, "team": format_teams([team], mode, fields)[0]}
+        )
+        response.set_etag(etag + suffix)
+        return response
+    else:
+        abort(405)
+
+
+@app.route("/teams/<int:team_id>/players", methods=["GET"])
+@query_budget(4)
+@cached_response("team:{team_id}")
+@conditional_listing
+def team_players(team_id):
+    if request.method == "GET":
+        if db.session.query(Team.id).filter_by(id=team_id).scalar() is None:
+            abort(404)
+
+        criteria = [Player.team_id == team_id] + player_filters()
+        fields = requested_fields(PLAYER_FIELDS)
+        player_items, next_cursor = keyset_paginate(
+            player_listing_query(fields).filter(*criteria), Player.id
+        )
+        response = {
+            "success": True,
+            "team_id": team_id,
+            "players": format_players(player_items, fields),
+            "next_cursor": next_cursor,
+        }
+        if with_total_requested():
+            response["total_players"] = Player.query.filter(*criteria).count()
+
+        return jsonify(response)
     else:
         abort(405)
 
 
 @app.route("/teams/<int:team_id>", methods=["PATCH"])
+@query_budget(4)
 @requires_auth("update:teams")
 def update_team_details(jwt, team_id):
     if request.method == "PATCH":
-        team = Team.query.filter_by(id=team_id).one_or_none()
-        if team is None:
-            abort(404)
-        previous_team_info = team.format()
-        body = request.get_json()
-        team.name = body.get("name")
-        team.location = body.get("location")
-        team.division = body.get("division")
-        team.level = body.get("level")
+        versions = if_match_versions("team", team_id)
+        body = request.get_json(silent=True)
         try:
-
-            team.update()
-
-            return jsonify(
-                {
-                    "success": True,
-                    "new_team_info": team.format(),
-                    "previous_team_info": previous_team_info,
-                }
+            previous_team_info, new_team_info, etag = update_team(
+                team_id, body, versions
             )
+        except HTTPException:
+            raise
         except:
             db.session.rollback()
             abort(422)
+
+        response = jsonify(
+            {
+                "success": True,
+                "new_team_info": new_team_info,
+                "previous_team_info": previous_team_info,
+            }
+        )
+        # The ETag of GET /teams/<id>, to chain If-Match updates
+        response.set_etag(f"{etag}-{team_roster_mode(None)}")
+        return response
     else:
         abort(405)
 
 
 @app.route("/teams/<int:team_id>", methods=["DELETE"])
+@query_budget(6)
 @requires_auth("delete:teams")
 def delete_team(jwt, team_id):
     if request.method == "DELETE":
-        team = Team.query.filter_by(id=team_id).one_or_none()
-        if team is None:
-            abort(404)
+        policy = app.config["TEAM_DELETE_POLICY"]
         try:
-
-            team.delete()
-
-            return jsonify({"success": True, "deleted": team_id})
+            player_ids = bulk_delete_team(team_id, policy)
+        except HTTPException:
+            raise
         except:
             db.session.rollback()
             abort(422)
+
+        if policy == "cascade":
+            report = "players_deleted"
+        else:
+            report = "players_detached"
+        return jsonify(
+            {"success": True, "deleted": team_id, report: len(player_ids),}
+        )
     else:
         abort(405)
 
 
+# Operational details, only for those allowed to delete teams (admins)
+@app.route("/cache/stats", methods=["GET"])
+@requires_auth("delete:teams")
+def cache_stats(jwt):
+    return jsonify({"success": True, "cache": response_cache.stats()})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    if not metrics.enabled:
+        abort(404)
+
+    return app.response_class(
+        metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
+
+
+@app.route("/pool/stats", methods=["GET"])
+@requires_auth("delete:teams")
+def connection_pool_stats(jwt):
+    return jsonify(
+        {
+            "success": True,
+            "pool": pool_stats.snapshot(db.engine.pool),
+            "replicas": replica_router.stats(),
+        }
+    )
+
+
+@app.errorhandler(400)
+def bad_request(e):
+    return (
+        jsonify({"success": False, "error": 400, "message": "bad request"}),
+        400,
+    )
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     return (
@@ -269,6 +616,42 @@ def method_not_allowed(e):
     )
 
 
+@app.errorhandler(406)
+def not_acceptable(e):
+    return (
+        jsonify({"success": False, "error": 406, "message": "not acceptable"}),
+        406,
+    )
+
+
+@app.errorhandler(409)
+def conflict(e):
+    return (
+        jsonify({"success": False, "error": 409, "message": "conflict"}),
+        409,
+    )
+
+
+@app.errorhandler(412)
+def precondition_failed(e):
+    return (
+        jsonify(
+            {"success": False, "error": 412, "message": "precondition failed"}
+        ),
+        412,
+    )
+
+
+@app.errorhandler(413)
+def payload_too_large(e):
+    return (
+        jsonify(
+            {"success": False, "error": 413, "message": "payload too large"}
+        ),
+        413,
+    )
+
+
 @app.errorhandler(422)
 def unprocessable(error):
     return (
@@ -0,0 +1,96 @@
+import json
+from flask import current_app
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used without it
+    orjson = None
+
+JSON_BACKENDS = ("auto", "orjson", "json")
+
+# Dates, UUIDs and dataclasses are encoded the way flask.jsonify does
+_flask_default = JSONEncoder().default
+
+
+class StdlibBackend:
+    name = "json"
+
+    def __init__(self, sort_keys=True):
+        self.sort_keys = sort_keys
+
+    def dumps(self, obj):
+        return json.dumps(
+            obj,
+            separators=(",", ":"),
+            sort_keys=self.sort_keys,
+            default=_flask_default,
+        ).encode()
+
+
+class OrjsonBackend:
+    name = "orjson"
+
+    def __init__(self, sort_keys=True):
+        self.option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            self.option |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=_flask_default, option=self.option)
+
+
+class JSONSerializer:
+    """Encodes response bodies with orjson when installed, else ``json``.
+
+    ``JSON_BACKEND`` is "auto" (the default), "orjson" or "json". Output
+    matches ``flask.jsonify`` outside debug mode: compact, with the keys
+    sorted unless ``JSON_SORT_KEYS`` is off.
+    """
+
+    def __init__(self):
+        self.backend = StdlibBackend()
+
+    def init_app(self, app):
+        backend = app.config.get("JSON_BACKEND", "auto")
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON_BACKEND {backend!r}")
+
+        sort_keys = app.config.get("JSON_SORT_KEYS", True)
+        if backend == "orjson" or (backend == "auto" and orjson is not None):
+            if orjson is None:
+                raise RuntimeError("JSON_BACKEND=orjson needs orjson")
+            self.backend = OrjsonBackend(sort_keys)
+        else:
+            self.backend = StdlibBackend(sort_keys)
+
+        app.extensions["json_serializer"] = self
+
+    def dumps(self, obj):
+        return self.backend.dumps(obj)
+
+
+json_serializer = JSONSerializer()
+
+
+def dumps(obj):
+    return json_serializer.dumps(obj)
+
+
+def jsonify(*args, **kwargs):
+    """Drop-in for ``flask.jsonify`` that encodes with ``json_serializer``"""
+    if args and kwargs:
+        raise TypeError("jsonify() takes either args or kwargs, not both")
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+
+    return current_app.response_class(
+        dumps(data) + b"\n", mimetype=current_app.config["JSONIFY_MIMETYPE"]
+    )
+
+
+def format_rows(fields, rows):
+    """Dicts for plain row tuples, with ``fields`` as the keys in order"""
+    return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,223 @@
+from flask import abort
+from sqlalchemy import and_, exists, func, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from .bulk import PLAYER_FIELDS, TEAM_FIELDS, validate_changes
+from .cache import response_cache
+from .conditional import player_etag, team_etag
+from .database.models import db, Player, Team
+
+
+def team_name(team_id_column):
+    return func.coalesce(
+        select([Team.name]).where(Team.id == team_id_column).as_scalar(), "",
+    )
+
+
+def team_version(team_id_column):
+    return select([Team.version]).where(Team.id == team_id_column).as_scalar()
+
+
+def roster_fingerprint(team_id_column):
+    """Player count and sums of versions and ids, as in a team's ETag"""
+    players = Player.__table__
+    return {
+        name: select([aggregate])
+        .where(players.c.team_id == team_id_column)
+        .as_scalar()
+        for name, aggregate in (
+            ("roster_count", func.count(players.c.id)),
+            ("roster_versions", func.coalesce(func.sum(players.c.version), 0)),
+            ("roster_ids", func.coalesce(func.sum(players.c.id), 0)),
+        )
+    }
+
+
+def team_roster(team_id_column):
+    return (
+        select([func.array_agg(aggregate_order_by(Player.name, Player.id))])
+        .where(Player.team_id == team_id_column)
+        .as_scalar()
+    )
+
+
+def row_columns(model, source, prefix, postgres):
+    """Columns giving the ``format()`` of a row and its ETag"""
+    columns = {name: source.c[name] for name in model.FORMAT_FIELDS}
+    columns["version"] = source.c.version
+    if model is Player:
+        columns["team_id"] = source.c.team_id
+        columns["team"] = team_name(source.c.team_id)
+        columns["team_version"] = team_version(source.c.team_id)
+    else:
+        columns.update(roster_fingerprint(source.c.id))
+        if postgres:
+            columns["roster"] = team_roster(source.c.id)
+    return [column.label(prefix + name) for name, column in columns.items()]
+
+
+def split_row(row, prefix):
+    return {
+        name[len(prefix) :]: row[name]
+        for name in row.keys()
+        if name.startswith(prefix)
+    }
+
+
+def reject_update(model, row_id, versions):
+    """Abort with the reason a conditional UPDATE matched no row"""
+    version = (
+        db.session.query(model.version).filter(model.id == row_id).scalar()
+    )
+    if version is None:
+        abort(404)
+    if versions is not None and version not in versions:
+        abort(412)
+    # The only condition left is the existence of the new team
+    abort(422)
+
+
+def update_returning(model, row_id, changes, conditions, versions):
+    """Postgres: change the row and read it before and after in one go.
+
+    The previous values come from a locked subquery of the row joined to
+    the UPDATE, so they are the ones the update actually replaced.
+    """
+    table = model.__table__
+    values = dict(changes, version=table.c.version + 1)
+    old = (
+        select([table])
+        .where(table.c.id == row_id)
+        .with_for_update()
+        .alias("old")
+    )
+    statement = (
+        table.update()
+        .values(values)
+        .where(and_(table.c.id == old.c.id, *conditions))
+        .returning(
+            *row_columns(model, old, "old_", True),
+            *row_columns(model, table, "new_", True),
+        )
+    )
+    if versions is not None:
+        statement = statement.where(old.c.version.in_(versions))
+
+    row = db.session.execute(statement).first()
+    if row is None:
+        reject_update(model, row_id, versions)
+
+    return split_row(row, "old_"), split_row(row, "new_")
+
+
+def update_checked(model, row_id, changes, conditions, versions):
+    """Other backends: read the row, then update it if still unchanged"""
+    table = model.__table__
+    columns = row_columns(model, table, "", False)
+    if "team_id" in changes:
+        columns.append(team_name(changes["team_id"]).label("new_team"))
+        columns.append(
+            team_version(changes["team_id"]).label("new_team_version")
+        )
+
+    row = db.session.execute(
+        select(columns).where(table.c.id == row_id).with_for_update()
+    ).first()
+    if row is None:
+        abort(404)
+    previous = split_row(row, "")
+    new_team = previous.pop("new_team", None)
+    new_team_version = previous.pop("new_team_version", None)
+    if versions is not None and previous["version"] not in versions:
+        abort(412)
+
+    result = db.session.execute(
+        table.update()
+        .values(dict(changes, version=table.c.version + 1))
+        .where(
+            and_(
+                table.c.id == row_id,
+                table.c.version == previous["version"],
+                *conditions,
+            )
+        )
+    )
+    if result.rowcount != 1:
+        reject_update(model, row_id, versions)
+
+    new = dict(previous, **changes, version=previous["version"] + 1)
+    if new_team is not None:
+        new["team"] = new_team
+        new["team_version"] = new_team_version
+    return previous, new
+
+
+def partial_update(model, row_id, body, fields, versions=None):
+    """Change only the fields in ``body`` and return the old and new row.
+
+    ``versions`` are the versions the client's If-Match ETags were issued
+    for; the row is only changed while at one of them, with a 412
+    otherwise. A ``team_id`` is checked against the team table in the
+    same UPDATE.
+    """
+    changes = validate_changes(body, model.__table__, fields)
+    if versions is not None and not versions:
+        reject_update(model, row_id, versions)
+
+    conditions = []
+    if changes.get("team_id") is not None:
+        conditions.append(exists().where(Team.id == changes["team_id"]))
+
+    if db.engine.dialect.name == "postgresql":
+        update = update_returning
+    else:
+        update = update_checked
+    previous, new = update(model, row_id, changes, conditions, versions)
+    db.session.commit()
+
+    return previous, new
+
+
+def formatted(model, row):
+    info = {name: row[name] for name in model.FORMAT_FIELDS}
+    if model is Player:
+        info["team"] = row["team"]
+    else:
+        info["roster"] = row.get("roster") or []
+    return info
+
+
+def update_player(player_id, body, versions=None):
+    """Old and new player, and the ETag of the new one with its team"""
+    previous, new = partial_update(
+        Player, player_id, body, PLAYER_FIELDS, versions
+    )
+
+    tags = {"players", "teams", f"player:{player_id}"}
+    tags.update(
+        f"team:{team_id}"
+        for team_id in (previous["team_id"], new["team_id"])
+        if team_id is not None
+    )
+    response_cache.invalidate(tags)
+
+    etag = player_etag(player_id, new["version"], True, new["team_version"])
+    return formatted(Player, previous), formatted(Player, new), etag
+
+
+def update_team(team_id, body, versions=None):
+    """Old and new team, and the ETag of the new one with its roster"""
+    previous, new = partial_update(Team, team_id, body, TEAM_FIELDS, versions)
+    response_cache.invalidate({"teams", "players", f"team:{team_id}"})
+
+    if "roster" not in previous:
+        # Only Postgres returns the roster, which a team update leaves as is
+        previous["roster"] = new["roster"] = [
+            name
+            for (name,) in db.session.query(Player.name)
+            .filter(Player.team_id == team_id)
+            .order_by(Player.id)
+        ]
+
+    roster = (new["roster_count"], new["roster_versions"], new["roster_ids"])
+    etag = team_etag(team_id, new["version"], roster)
+    return formatted(Team, previous), formatted(Team, new), etag
@@ -0,0 +1,423 @@
+"""Offline load test of every route against a seeded local league.
+
+Run from the repository root:
+
+    python -m benchmarks.load --teams 10000 --players 1000000 \\
+        --requests 500 --concurrency 16 --json results.json
+
+A synthetic league is seeded into DATABASE_URL (a throwaway SQLite file
+unless --database-url is given; its tables are dropped and recreated).
+Tokens are signed with a key generated for the run and verified against
+a local JWKS file, so no Auth0 tenant or network access is needed. Each
+route is driven in-process through Flask's test client by --concurrency
+threads, and the throughput, p50/p95/p99 latency and SQL statements per
+request are reported, optionally as JSON to compare runs.
+"""
+import argparse
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+
+AUDIENCE = "players-and-teams"
+DOMAIN = "benchmark.local"
+PERMISSIONS = [
+    "create:players",
+    "update:players",
+    "delete:players",
+    "create:teams",
+    "update:teams",
+    "delete:teams",
+]
+
+Scenario = namedtuple("Scenario", "name method path body auth")
+
+
+def base64url_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def local_auth(directory, key_bits=2048):
+    """Write a JWKS file for a fresh key and return an admin token"""
+    import rsa
+    from jose import jwt
+
+    public_key, private_key = rsa.newkeys(key_bits)
+    jwks = {
+        "keys": [
+            {
+                "kty": "RSA",
+                "kid": "benchmark",
+                "use": "sig",
+                "n": base64url_uint(public_key.n),
+                "e": base64url_uint(public_key.e),
+            }
+        ]
+    }
+    jwks_path = os.path.join(directory, "jwks.json")
+    with open(jwks_path, "w") as jwks_file:
+        json.dump(jwks, jwks_file)
+
+    token = jwt.encode(
+        {
+            "iss": f"https://{DOMAIN}/",
+            "aud": AUDIENCE,
+            "sub": "benchmark",
+            "exp": int(time.time()) + 86400,
+            "permissions": PERMISSIONS,
+        },
+        private_key.save_pkcs1().decode(),
+        algorithm="RS256",
+        headers={"kid": "benchmark"},
+    )
+    return f"file://{jwks_path}", token
+
+
+def seed_league(teams, players, seed):
+    """Load a synthetic league, with COPY on Postgres"""
+    from app.database.importer import import_league
+    from app.database.synthetic import SyntheticLeague
+
+    league = SyntheticLeague(teams, players, seed)
+    import_league(
+        teams=league.teams(), players=league.players(), batch_size=10000
+    )
+
+
+def scenarios(max_team_id, max_player_id):
+    """One scenario per route.
+
+    Reads come first, then writes, with the deletes last so they never
+    remove rows another scenario still expects.
+    """
+    player = {
+        "name": "Benchmark Player",
+        "gender": "F",
+        "jersey_number": 7,
+        "position": "Cutter",
+        "team_id": 1,
+    }
+    team = {
+        "name": "Benchmark Team",
+        "location": "Dallas, TX",
+        "division": "Mixed",
+        "level": "Club",
+    }
+
+    def player_id(i):
+        return i % max_player_id + 1
+
+    def team_id(i):
+        return i % max_team_id + 1
+
+    def bulk_ids(i):
+        return list(range(i * 100 + 1, i * 100 + 101))
+
+    return [
+        Scenario("GET /", "GET", lambda i: "/", None, False),
+        Scenario("GET /players", "GET", lambda i: "/players", None, False),
+        Scenario(
+            "GET /players?page",
+            "GET",
+            lambda i: f"/players?page={i % 50 + 1}",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /players?limit",
+            "GET",
+            lambda i: f"/players?limit=100&team_id={team_id(i)}",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /players/export",
+            "GET",
+            lambda i: f"/players/export?team_id={team_id(i)}",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /players/<id>",
+            "GET",
+            lambda i: f"/players/{player_id(i)}",
+            None,
+            False,
+        ),
+        Scenario("GET /teams", "GET", lambda i: "/teams", None, False),
+        Scenario(
+            "GET /teams/export",
+            "GET",
+            lambda i: f"/teams/export?team_id={team_id(i)}",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /teams/<id>",
+            "GET",
+            lambda i: f"/teams/{team_id(i)}",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /teams/<id>/players",
+            "GET",
+            lambda i: f"/teams/{team_id(i)}/players",
+            None,
+            False,
+        ),
+        Scenario(
+            "GET /cache/stats", "GET", lambda i: "/cache/stats", None, True
+        ),
+        Scenario(
+            "GET /pool/stats", "GET", lambda i: "/pool/stats", None, True
+        ),
+        Scenario("GET /metrics", "GET", lambda i: "/metrics", None, False),
+        Scenario("POST /players", "POST", lambda i: "/players", player, True),
+        Scenario(
+            "POST /players/bulk",
+            "POST",
+            lambda i: "/players/bulk",
+            [player] * 100,
+            True,
+        ),
+        Scenario("POST /teams", "POST", lambda i: "/teams", team, True),
+        Scenario(
+            "POST /teams/bulk",
+            "POST",
+            lambda i: "/teams/bulk",
+            [team] * 100,
+            True,
+        ),
+        Scenario(
+            "PATCH /players/<id>",
+            "PATCH",
+            lambda i: f"/players/{player_id(i)}",
+            player,
+            True,
+        ),
+        Scenario(
+            "PATCH /players/bulk",
+            "PATCH",
+            lambda i: "/players/bulk",
+            lambda i: {"ids": bulk_ids(i), "set": {"position": "Hybrid"}},
+            True,
+        ),
+        Scenario(
+            "PATCH /teams/<id>",
+            "PATCH",
+            lambda i: f"/teams/{team_id(i)}",
+            team,
+            True,
+        ),
+        Scenario(
+            "DELETE /players/<id>",
+            "DELETE",
+            lambda i: f"/players/{max_player_id - i}",
+            None,
+            True,
+        ),
+        Scenario(
+            "DELETE /players/bulk",
+            "DELETE",
+            lambda i: "/players/bulk",
+            lambda i: {"ids": bulk_ids(i)},
+            True,
+        ),
+        Scenario(
+            "DELETE /teams/<id>",
+            "DELETE",
+            lambda i: f"/teams/{max_team_id - i}",
+            None,
+            True,
+        ),
+    ]
+
+
+class QueryCounter:
+    """SQL statements executed by the current thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def install(self, engine):
+        from sqlalchemy import event
+
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = max(0, int(round(fraction * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(app, scenario, requests, concurrency, token, queries):
+    headers = {"Authorization": f"Bearer {token}"} if scenario.auth else {}
+    local = threading.local()
+
+    def request(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+
+        body = scenario.body(i) if callable(scenario.body) else scenario.body
+        queries.reset()
+        started = time.perf_counter()
+        response = client.open(
+            scenario.path(i),
+            method=scenario.method,
+            json=body,
+            headers=headers,
+        )
+        # Streamed bodies are only produced once they are read
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        return elapsed, queries.count, response.status_code < 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, range(requests)))
+    wall_seconds = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+    return {
+        "route": scenario.name,
+        "requests": requests,
+        "errors": sum(1 for _, _, ok in results if not ok),
+        "requests_per_second": requests / wall_seconds,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "queries_per_request": sum(count for _, count, _ in results)
+        / requests,
+    }
+
+
+def print_report(results):
+    print(
+        f"{'route':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'queries':>9}{'errors':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['route']:<26}{result['requests_per_second']:>9.1f}"
+            f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['queries_per_request']:>9.1f}"
+            f"{result['errors']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--database-url",
+        help="database to seed and benchmark, its tables are dropped",
+    )
+    parser.add_argument(
+        "--skip-seed",
+        action="store_true",
+        help="benchmark --database-url as it is, without reseeding",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--routes", default="*", help="comma separated route name patterns"
+    )
+    parser.add_argument(
+        "--cache",
+        default="none",
+        choices=("none", "memory"),
+        help="response cache backend (default: none)",
+    )
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmark-")
+    jwks_url, token = local_auth(directory)
+    database_url = args.database_url or "sqlite:///{}".format(
+        os.path.join(directory, "league.db")
+    )
+
+    # The auth module and config read these when they are imported
+    os.environ.update(
+        AUTH0_DOMAIN=DOMAIN,
+        API_AUDIENCE=AUDIENCE,
+        ALGORITHMS="RS256",
+        JWKS_URL=jwks_url,
+        JWKS_BACKGROUND_REFRESH="0",
+        DATABASE_URL=database_url,
+        DB_STARTUP="verify" if args.skip_seed else "reset",
+        RESPONSE_CACHE_BACKEND=args.cache,
+        # Otherwise /metrics is a 404 and its scenario measures nothing
+        METRICS_ENABLED="1",
+    )
+    from app import create_app
+    from app.database.models import db, Player, Team
+
+    app = create_app(False)
+    app.logger.setLevel("WARNING")
+
+    with app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed_league(args.teams, args.players, args.seed)
+            print(
+                f"Seeded {args.teams} teams and {args.players} players"
+                f" in {time.perf_counter() - started:.1f}s"
+            )
+
+        max_team_id = db.session.query(db.func.max(Team.id)).scalar() or 1
+        max_player_id = db.session.query(db.func.max(Player.id)).scalar() or 1
+        queries = QueryCounter()
+        queries.install(db.engine)
+        db.session.remove()
+
+    patterns = args.routes.split(",")
+    results = [
+        run_scenario(
+            app, scenario, args.requests, args.concurrency, token, queries
+        )
+        for scenario in scenarios(max_team_id, max_player_id)
+        if any(fnmatch(scenario.name, pattern) for pattern in patterns)
+    ]
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(
+                {
+                    "settings": {
+                        key: value
+                        for key, value in vars(args).items()
+                        if key != "json"
+                    },
+                    "results": results,
+                },
+                output,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
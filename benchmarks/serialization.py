@@ -0,0 +1,128 @@
+"""Compare Player.format() + flask.jsonify with the row serialization layer.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization [--sizes 20,1000,100000]
+
+Every listing size is read from a throwaway SQLite database, encoded and
+timed end to end (query, formatting and encoding).
+"""
+import argparse
+import os
+import tempfile
+import timeit
+from flask import Flask, jsonify as flask_jsonify
+from sqlalchemy.orm import joinedload
+from app.database.models import db, setup_db, Player, Team
+from app.fields import format_players, player_listing_query
+from app.serialization import (
+    OrjsonBackend,
+    StdlibBackend,
+    json_serializer,
+    jsonify,
+    orjson,
+)
+
+
+def create_benchmark_app(database_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    setup_db(app)
+    json_serializer.init_app(app)
+    return app
+
+
+def populate(players, teams=100):
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(
+        Team,
+        [
+            {
+                "id": number,
+                "name": f"Team {number}",
+                "location": "Richardson, Texas",
+                "division": "Mixed",
+                "level": "Club",
+            }
+            for number in range(1, teams + 1)
+        ],
+    )
+    db.session.bulk_insert_mappings(
+        Player,
+        [
+            {
+                "name": f"Player {number}",
+                "gender": "F" if number % 2 else "M",
+                "jersey_number": number % 100,
+                "position": "Cutter",
+                # Every tenth player is a free agent
+                "team_id": number % teams + 1 if number % 10 else None,
+            }
+            for number in range(players)
+        ],
+    )
+    db.session.commit()
+
+
+def format_and_jsonify(size):
+    players = Player.query.options(joinedload(Player.team)).limit(size).all()
+    return flask_jsonify({"players": [player.format() for player in players]})
+
+
+def rows_and_serializer(size):
+    players = player_listing_query(None).limit(size).all()
+    return jsonify({"players": format_players(players, None)})
+
+
+def run(sizes, repeat):
+    backends = [("json", StdlibBackend())]
+    if orjson is not None:
+        backends.append(("orjson", OrjsonBackend()))
+
+    print(f"{'rows':>8}  {'variant':<28}{'best ms':>10}{'speedup':>9}")
+    for size in sizes:
+        populate(size)
+        db.session.remove()
+
+        number = max(1, 2000 // size)
+        baseline = None
+        variants = [("format() + flask.jsonify", format_and_jsonify, None)]
+        variants.extend(
+            (f"rows + {name}", rows_and_serializer, backend)
+            for name, backend in backends
+        )
+
+        for label, variant, backend in variants:
+            if backend is not None:
+                json_serializer.backend = backend
+
+            def call():
+                variant(size)
+                db.session.remove()
+
+            best = min(timeit.repeat(call, number=number, repeat=repeat))
+            milliseconds = best / number * 1000
+            if baseline is None:
+                baseline = milliseconds
+            print(
+                f"{size:>8}  {label:<28}{milliseconds:>10.2f}"
+                f"{baseline / milliseconds:>8.1f}x"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="20,1000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(os.path.join(directory, "bench.db"))
+        with app.test_request_context():
+            run([int(size) for size in args.sizes.split(",")], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,11 +16,86 @@ class Config:
     SQLALCHEMY_DATABASE_URI = environ.get("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Read replicas for GET requests, used round-robin; replicas more than
+    # REPLICA_MAX_LAG_SECONDS behind, or unreachable, fall back to the
+    # primary until they are checked again
+    SQLALCHEMY_REPLICA_URIS = [
+        uri
+        for uri in environ.get("DATABASE_REPLICA_URLS", "").split(",")
+        if uri
+    ]
+    REPLICA_MAX_LAG_SECONDS = float(environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_CHECK_INTERVAL = float(environ.get("REPLICA_CHECK_INTERVAL", 5))
+    REPLICA_RETRY_INTERVAL = float(environ.get("REPLICA_RETRY_INTERVAL", 30))
+
+    # Connection pool per worker process; size workers so that
+    # workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below the
+    # server's max_connections
+    DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(environ.get("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = int(environ.get("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_STATEMENT_TIMEOUT_MS = int(environ.get("DB_STATEMENT_TIMEOUT_MS", 0))
+
+    # Totals of unfiltered listings: "exact" counts rows on every request,
+    # "cached" reads the count kept up to date in table_version and
+    # "estimate" uses the Postgres planner statistics
+    COUNT_STRATEGY = environ.get("COUNT_STRATEGY", "exact")
+
+    # What deleting a team does to its players: "detach" releases them,
+    # "cascade" deletes them and "restrict" refuses while it has players
+    TEAM_DELETE_POLICY = environ.get("TEAM_DELETE_POLICY", "detach")
+
+    # "verify" checks the schema revision against migrations/ on startup,
+    # "reset" drops, recreates and seeds every table
+    DB_STARTUP = environ.get("DB_STARTUP", "verify")
+
+    # Seconds the table versions behind ETags are trusted without
+    # re-reading them; writes from other processes show up after this
+    ETAG_VERSION_TTL = float(environ.get("ETAG_VERSION_TTL", 0))
+
+    # JSON encoder for responses: "auto" uses orjson when it is installed
+    # and the standard library json module otherwise, "orjson" or "json"
+    JSON_BACKEND = environ.get("JSON_BACKEND", "auto")
+
+    # gzip, or brotli when the brotli package is installed, for JSON, NDJSON
+    # and CSV bodies of at least COMPRESSION_MIN_SIZE bytes; routes can
+    # override the level with @compression_level
+    COMPRESSION_ENABLED = environ.get("COMPRESSION_ENABLED", "1") == "1"
+    COMPRESSION_LEVEL = int(environ.get("COMPRESSION_LEVEL", 6))
+    COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 1024))
+
+    # Request, SQL and auth metrics served on /metrics for Prometheus;
+    # nothing is recorded while this is off
+    METRICS_ENABLED = environ.get("METRICS_ENABLED", "0") == "1"
+
+    # Log statements slower than this many milliseconds, 0 turns it off
+    SLOW_QUERY_MS = float(environ.get("SLOW_QUERY_MS", 0))
+    # Count each request's statements to warn about N+1 queries (the same
+    # statement N_PLUS_ONE_THRESHOLD times or more) and check routes
+    # against their @query_budget, failing them when enforced
+    QUERY_DIAGNOSTICS = environ.get("QUERY_DIAGNOSTICS", "0") == "1"
+    QUERY_BUDGET_ENFORCE = environ.get("QUERY_BUDGET_ENFORCE", "0") == "1"
+    N_PLUS_ONE_THRESHOLD = int(environ.get("N_PLUS_ONE_THRESHOLD", 5))
+
+    # Response cache for GET routes: "memory", "redis" or "none"
+    RESPONSE_CACHE_BACKEND = environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_URL = environ.get("RESPONSE_CACHE_URL")
+    RESPONSE_CACHE_TTL = int(environ.get("RESPONSE_CACHE_TTL", 300))
+    RESPONSE_CACHE_MAX_ENTRIES = int(
+        environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+    )
+
 
 class ProdConfig(Config):
     ENV = "production"
     DEBUG = False
     TESTING = False
+    DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 10))
+    DB_STATEMENT_TIMEOUT_MS = int(
+        environ.get("DB_STATEMENT_TIMEOUT_MS", 30000)
+    )
 
 
 class StagingConfig(Config):
@@ -32,3 +107,5 @@ class DevConfig(Config):
     ENV = "development"
     DEBUG = True
     TESTING = True
+    DB_STARTUP = environ.get("DB_STARTUP", "reset")
+    DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 2))
@@ -0,0 +1,37 @@
+"""index player filter columns
+
+Revision ID: 50016b8d599b
+Revises: 625c07243bb8
+Create Date: 2026-10-18 11:02:15.552310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '50016b8d599b'
+down_revision = '625c07243bb8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_player_team_id'), 'player', ['team_id'],
+                    unique=False)
+    op.create_index(op.f('ix_player_position'), 'player', ['position'],
+                    unique=False)
+    op.create_index(op.f('ix_player_gender'), 'player', ['gender'],
+                    unique=False)
+    op.create_index(op.f('ix_player_jersey_number'), 'player',
+                    ['jersey_number'], unique=False)
+    op.create_index(op.f('ix_team_division'), 'team', ['division'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_team_division'), table_name='team')
+    op.drop_index(op.f('ix_player_jersey_number'), table_name='player')
+    op.drop_index(op.f('ix_player_gender'), table_name='player')
+    op.drop_index(op.f('ix_player_position'), table_name='player')
+    op.drop_index(op.f('ix_player_team_id'), table_name='player')
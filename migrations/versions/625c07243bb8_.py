@@ -0,0 +1,39 @@
+"""add row and table versions
+
+Revision ID: 625c07243bb8
+Revises: 8d8de8c2cf47
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '625c07243bb8'
+down_revision = '8d8de8c2cf47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('player', sa.Column('version', sa.Integer(),
+                  server_default='1', nullable=False))
+    op.add_column('team', sa.Column('version', sa.Integer(),
+                  server_default='1', nullable=False))
+    table_version = op.create_table(
+        'table_version',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_version, [
+        {'name': 'player', 'version': 0},
+        {'name': 'team', 'version': 0},
+    ])
+
+
+def downgrade():
+    op.drop_table('table_version')
+    op.drop_column('team', 'version')
+    op.drop_column('player', 'version')
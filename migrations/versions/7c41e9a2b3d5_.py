@@ -0,0 +1,30 @@
+"""add table row counts
+
+Revision ID: 7c41e9a2b3d5
+Revises: 50016b8d599b
+Create Date: 2026-10-18 12:20:37.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41e9a2b3d5'
+down_revision = '50016b8d599b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('table_version', sa.Column('row_count', sa.BigInteger(),
+                  nullable=True))
+    for name in ('player', 'team'):
+        op.execute(
+            "UPDATE table_version SET row_count = "
+            "(SELECT count(*) FROM {0}) WHERE name = '{0}'".format(name)
+        )
+
+
+def downgrade():
+    op.drop_column('table_version', 'row_count')
@@ -0,0 +1,36 @@
+"""index gender and position with team_id, drop the team_id index
+
+Revision ID: e4b7d2c9a1f6
+Revises: 7c41e9a2b3d5
+Create Date: 2026-10-18 16:41:09.215873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7d2c9a1f6'
+down_revision = '7c41e9a2b3d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_player_gender', table_name='player')
+    op.drop_index('ix_player_position', table_name='player')
+    op.create_index('ix_player_team_id_gender', 'player',
+                    ['team_id', 'gender'], unique=False)
+    op.create_index('ix_player_team_id_position', 'player',
+                    ['team_id', 'position'], unique=False)
+    op.drop_index('ix_player_team_id', table_name='player')
+
+
+def downgrade():
+    op.create_index('ix_player_team_id', 'player', ['team_id'],
+                    unique=False)
+    op.drop_index('ix_player_team_id_position', table_name='player')
+    op.drop_index('ix_player_team_id_gender', table_name='player')
+    op.create_index('ix_player_position', 'player', ['position'],
+                    unique=False)
+    op.create_index('ix_player_gender', 'player', ['gender'], unique=False)
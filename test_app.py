@@ -1,12 +1,54 @@
 import unittest
+import gc
+import gzip
+import io
 import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import redirect_stdout
 from os import getenv
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from unittest import mock
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.dialects import postgresql
 
 from app import create_app
-from app.database.models import db, Player, Team
+from alembic.script import ScriptDirectory
+from app.database.models import (
+    db,
+    Player,
+    Team,
+    TableVersion,
+    MIGRATIONS_DIRECTORY,
+    verify_schema_revision,
+)
+from benchmarks.load import AUDIENCE, DOMAIN, local_auth
+from app.auth.auth import token_cache, verify_decode_jwt
+from app.auth.jwks import JWKSCache, JWKSUnavailable
+from app.auth.tokens import VerifiedTokenCache
+from app.cache import MemoryBackend, RedisBackend, response_cache
+from app.bulk import init_bulk
+from app.counts import init_counts
+from app.database.manage import Recount
+from app.database.importer import InvalidImportRow, import_league
+from app.database.synthetic import SyntheticLeague, write_league
+from app.database import pool as pool_module
+from app.database.pool import (
+    TimedQueuePool,
+    dispose_before_fork,
+    engine_options,
+    pool_stats,
+)
+from app.database.replicas import replica_router
+from app.diagnostics import query_diagnostics
+from app.metrics import Histogram, metrics
+from app.updates import update_returning
+from app.serialization import OrjsonBackend, StdlibBackend, orjson
 
 
 class UltimatePlayersTestCase(unittest.TestCase):
@@ -69,6 +111,8 @@ class UltimatePlayersTestCase(unittest.TestCase):
         }
 
     def setUp(self):
+        response_cache.clear()
+
         def populate_db():
             db.create_all()
             new_team = Team(
@@ -94,6 +138,45 @@ class UltimatePlayersTestCase(unittest.TestCase):
         db.drop_all()
         db.session.close()
 
+    def populate_league(self, teams=5, players_per_team=5):
+        for team_number in range(teams):
+            team = Team(
+                name=f"Team {team_number}",
+                location="Texas",
+                division="Mixed",
+                level="Club",
+            )
+            db.session.add(team)
+            for player_number in range(players_per_team):
+                db.session.add(
+                    Player(
+                        name=f"Player {team_number}-{player_number}",
+                        gender="F",
+                        jersey_number=player_number,
+                        position="Cutter",
+                        team=team,
+                    )
+                )
+        db.session.commit()
+        db.session.remove()
+
+    def count_queries(self, url, headers=None, status_code=200):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client().get(url, headers=headers)
+        finally:
+            event.remove(
+                db.engine, "before_cursor_execute", before_cursor_execute
+            )
+
+        self.assertEqual(response.status_code, status_code)
+        return len(statements)
+
     """The following tests are for all of the application's player endpoints"""
 
     def test_get_players(self):
@@ -113,6 +196,259 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_get_players_with_cursor(self):
+        for number in (7, 8):
+            Player(
+                name=f"Player {number}",
+                gender="M",
+                jersey_number=number,
+                position="Cutter",
+            ).insert()
+
+        response = self.client().get("/players?limit=2")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data["players"]), 2)
+        self.assertNotIn("total_players", data)
+        self.assertTrue(data["next_cursor"])
+
+        response = self.client().get(
+            f"/players?limit=2&after={data['next_cursor']}&with_total=1"
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data["players"]), 1)
+        self.assertEqual(data["total_players"], 3)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_cached_player_count_is_kept_up_to_date(self):
+        self.populate_league(teams=1, players_per_team=3)
+        self.client().delete(
+            "/players/bulk", json={"ids": [1, 2]}, headers=self.admin_headers
+        )
+        Player.query.get(3).delete()
+
+        self.app.config["COUNT_STRATEGY"] = "cached"
+        try:
+            response = self.client().get("/players")
+            data = json.loads(response.data)
+            filtered = json.loads(self.client().get("/players?gender=F").data)
+        finally:
+            self.app.config["COUNT_STRATEGY"] = "exact"
+
+        self.assertEqual(data["total_players"], Player.query.count())
+        self.assertEqual(data["count_strategy"], "cached")
+        self.assertEqual(filtered["count_strategy"], "exact")
+
+    def test_failed_version_bump_resets_cache_and_row_counts(self):
+        self.client().get("/players")
+        version = TableVersion.query.get("player").version
+        failure = exc.OperationalError("UPDATE", {}, Exception("gone"))
+
+        with mock.patch(
+            "app.database.versions.bump_versions", side_effect=failure
+        ):
+            with self.assertRaises(exc.OperationalError):
+                with self.assertLogs("app.database.versions", "ERROR"):
+                    Player(
+                        name="Unversioned",
+                        gender="F",
+                        jersey_number=3,
+                        position="Cutter",
+                    ).insert()
+        db.session.remove()
+
+        row = TableVersion.query.get("player")
+        self.assertEqual(Player.query.count(), 2)
+        self.assertEqual(row.version, version + 1)
+        self.assertIsNone(row.row_count)
+        self.assertIsNone(response_cache.backend.get(repr(("/players", []))))
+
+    def test_autocommitted_write_bumps_version_and_row_count(self):
+        row = TableVersion.query.get("player")
+        version, count = row.version, row.row_count
+        db.session.remove()
+
+        with self.assertLogs("app.database.versions", "INFO"):
+            db.engine.execute(
+                Player.__table__.insert(),
+                name="Autocommitted",
+                gender="F",
+                jersey_number=3,
+                position="Cutter",
+            )
+
+        row = TableVersion.query.get("player")
+        self.assertEqual(row.version, version + 1)
+        self.assertEqual(row.row_count, count + 1)
+
+    def test_unknown_count_strategy_fails_at_startup(self):
+        app = Flask(__name__)
+        app.config["COUNT_STRATEGY"] = "guess"
+
+        with self.assertRaises(ValueError):
+            init_counts(app)
+
+    def test_recount_command_refreshes_row_counts(self):
+        TableVersion.query.update({"row_count": None})
+        db.session.commit()
+
+        with redirect_stdout(io.StringIO()) as output:
+            Recount().run()
+
+        self.assertEqual(output.getvalue(), "Counted 1 teams and 1 players\n")
+        self.assertEqual(TableVersion.query.get("player").row_count, 1)
+
+    def test_estimated_count_falls_back_to_exact(self):
+        self.app.config["COUNT_STRATEGY"] = "estimate"
+        try:
+            response = self.client().get("/teams?limit=1&with_total=1")
+            data = json.loads(response.data)
+        finally:
+            self.app.config["COUNT_STRATEGY"] = "exact"
+
+        # SQLite has no planner statistics to estimate from
+        self.assertEqual(data["total_teams"], 1)
+        self.assertEqual(data["count_strategy"], "exact")
+
+    def test_400_if_players_cursor_is_malformed(self):
+        response = self.client().get("/players?after=not-a-cursor")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_get_players_with_sparse_fields(self):
+        response = self.client().get("/players?fields=id,name")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(data["players"][0]), {"id", "name"})
+
+        response = self.client().get("/players/1?fields=name,team")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(data["player"]), {"name", "team"})
+        self.assertEqual(data["player"]["team"], self.team_name)
+
+    def test_sparse_player_without_team_ignores_the_team(self):
+        etag = self.client().get("/players/1?fields=id,name").headers["ETag"]
+        team = Team.query.get(1)
+        team.name = "Renamed"
+        team.update()
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            response = self.client().get(
+                "/players/1?fields=id,name", headers={"If-None-Match": etag}
+            )
+        finally:
+            event.remove(
+                db.engine, "before_cursor_execute", before_cursor_execute
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any("JOIN team" in sql for sql in statements))
+
+    def test_players_listing_rows_match_player_format(self):
+        response = self.client().get("/players")
+        data = json.loads(response.data)
+
+        player = Player.query.get(data["players"][0]["id"])
+        self.assertEqual(data["players"][0], player.format())
+
+    def test_400_if_players_fields_unknown(self):
+        response = self.client().get("/players?fields=id,password")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_players_query_count_is_constant_per_page(self):
+        self.populate_league()
+
+        self.assertEqual(
+            self.count_queries("/players?limit=1"),
+            self.count_queries("/players?limit=20"),
+        )
+        self.assertEqual(self.count_queries("/players"), 3)
+
+    def test_export_players_as_ndjson(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get("/players/export")
+        rows = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]["team"], self.team_name)
+
+    def test_export_players_as_csv_filtered_by_team(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get(
+            "/players/export?team_id=2", headers={"Accept": "text/csv"}
+        )
+        lines = response.data.decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertEqual(
+            lines[0], "id,name,gender,jersey_number,position,team_id,team"
+        )
+        self.assertEqual(len(lines), 4)
+
+    def test_400_if_export_team_id_not_an_integer(self):
+        response = self.client().get("/players/export?team_id=abc")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_406_if_export_format_not_acceptable(self):
+        response = self.client().get(
+            "/players/export", headers={"Accept": "application/xml"}
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "not acceptable")
+
+    def test_get_players_with_combined_filters(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get(
+            "/players?team_id=2&position=Cutter&jersey_number=1"
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["total_players"], 1)
+        self.assertEqual(data["players"][0]["name"], "Player 0-1")
+
+    def test_get_players_filtered_by_division(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get("/players?division=Mixed&limit=5")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data["players"]), 5)
+        self.assertTrue(data["next_cursor"])
+
+    def test_400_if_player_filter_is_malformed(self):
+        response = self.client().get("/players?jersey_number=abc")
+
+        self.assertEqual(response.status_code, 400)
+
     def test_get_player_details_by_id(self):
         player = Player.query.filter_by(name=self.player_name).first()
         response = self.client().get(f"/players/{player.id}")
@@ -122,6 +458,105 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertTrue(data["player"])
 
+    def test_304_if_player_not_modified(self):
+        response = self.client().get("/players/1")
+        etag = response.headers["ETag"]
+
+        response = self.client().get(
+            "/players/1", headers={"If-None-Match": etag}
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_player_etag_changes_when_team_renamed(self):
+        etag = self.client().get("/players/1").headers["ETag"]
+        team = Team.query.get(1)
+        team.name = "Renamed"
+        team.update()
+
+        response = self.client().get(
+            "/players/1", headers={"If-None-Match": etag}
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["player"]["team"], "Renamed")
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_304_from_known_versions_skips_database(self):
+        self.app.config["ETAG_VERSION_TTL"] = 60
+        try:
+            etag = self.client().get("/players/1").headers["ETag"]
+            self.client().get("/players/1", headers={"If-None-Match": etag})
+
+            queries = self.count_queries(
+                "/players/1", headers={"If-None-Match": etag}, status_code=304,
+            )
+        finally:
+            self.app.config["ETAG_VERSION_TTL"] = 0
+
+        self.assertEqual(queries, 0)
+
+    def test_player_details_served_from_response_cache(self):
+        self.client().get("/players/1")
+        hits = response_cache.hits
+
+        # Only the table versions the entry is checked against are read
+        self.assertEqual(self.count_queries("/players/1"), 1)
+        self.assertEqual(response_cache.hits, hits + 1)
+
+    def test_player_update_invalidates_team_roster(self):
+        self.client().get("/teams/1")
+        player = Player.query.get(1)
+        player.name = "Renamed Player"
+        player.update()
+
+        response = self.client().get("/teams/1")
+        data = json.loads(response.data)
+
+        self.assertEqual(data["team"]["roster"], ["Renamed Player"])
+
+    def test_get_cache_stats(self):
+        response = self.client().get(
+            "/cache/stats", headers=self.admin_headers
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["cache"]["backend"], "MemoryBackend")
+        self.assertIn("hits", data["cache"])
+        self.assertIn("evictions", data["cache"])
+
+    def test_401_cache_stats_require_admin(self):
+        response = self.client().get(
+            "/cache/stats", headers=self.team_manager_headers
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(self.client().get("/pool/stats").status_code, 401)
+
+    def test_cached_response_not_served_after_a_later_write(self):
+        self.client().get("/players/1")
+        key = repr(("/players/1", []))
+        entry = response_cache.backend.get(key)
+
+        player = Player.query.get(1)
+        player.name = "Renamed Player"
+        player.update()
+        # Stored late by a request that read the player before the write,
+        # or still held by another worker
+        response_cache.set(key, entry, set())
+        stale = response_cache.stale
+
+        response = self.client().get("/players/1")
+        data = json.loads(response.data)
+
+        self.assertEqual(data["player"]["name"], "Renamed Player")
+        self.assertEqual(response_cache.stale, stale + 1)
+
     def test_404_if_player_not_found_by_id(self):
         response = self.client().get("/players/1000")
         data = json.loads(response.data)
@@ -161,6 +596,66 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    def test_bulk_create_players_reports_partial_failures(self):
+        response = self.client().post(
+            "/players/bulk",
+            json=[
+                self.new_player,
+                self.new_player_no_team,
+                dict(self.new_player, team_id=1000),
+                {"not_a_key": "bad data"},
+            ],
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["failed"], 2)
+        self.assertEqual(
+            data["results"][2]["errors"], ["team_id does not exist"]
+        )
+        self.assertEqual(Player.query.count(), 3)
+
+    def test_bulk_create_players_reports_team_id_zero(self):
+        response = self.client().post(
+            "/players/bulk",
+            json=[self.new_player, dict(self.new_player, team_id=0)],
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["created"], 1)
+        self.assertEqual(
+            data["results"][1]["errors"], ["team_id does not exist"]
+        )
+        self.assertEqual(Player.query.count(), 2)
+
+    def test_atomic_bulk_create_players_inserts_nothing_on_failure(self):
+        response = self.client().post(
+            "/players/bulk?atomic=1",
+            json={"players": [self.new_player, {"name": "No Details"}]},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["created"], 0)
+        self.assertEqual(Player.query.count(), 1)
+
+    def test_401_team_manager_cannot_bulk_create_players(self):
+        response = self.client().post(
+            "/players/bulk",
+            json=[self.new_player],
+            headers=self.team_manager_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(data["message"], "User does not have permission")
+
     def test_401_team_manager_cannot_post_player(self):
         response = self.client().post(
             "/players", json=self.new_player, headers=self.team_manager_headers
@@ -193,6 +688,62 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertTrue(data["new_player_info"])
         self.assertTrue(data["previous_player_info"])
 
+    def test_update_player_returns_the_new_etag(self):
+        response = self.client().patch(
+            "/players/1", json={"team_id": None}, headers=self.admin_headers
+        )
+        etag = self.client().get("/players/1").headers["ETag"]
+        chained = self.client().patch(
+            "/players/1",
+            json={"jersey_number": 9},
+            headers=dict(self.admin_headers, **{"If-Match": etag}),
+        )
+
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(chained.status_code, 200)
+        self.assertEqual(
+            chained.headers["ETag"],
+            self.client().get("/players/1").headers["ETag"],
+        )
+
+    def test_update_returning_compiles_for_postgres(self):
+        statements = []
+
+        def execute(statement):
+            statements.append(statement)
+            raise exc.OperationalError("UPDATE", {}, Exception("compiled"))
+
+        with mock.patch("app.updates.db") as database:
+            database.session.execute.side_effect = execute
+            with self.assertRaises(exc.OperationalError):
+                update_returning(Team, 1, {"level": "Club"}, [], {1, 2})
+        sql = str(statements[0].compile(dialect=postgresql.dialect()))
+
+        self.assertIn("FOR UPDATE", sql)
+        self.assertIn('"old".version IN', sql)
+        self.assertIn("RETURNING", sql)
+        self.assertIn("array_agg(player.name ORDER BY player.id)", sql)
+        self.assertIn("AS new_roster_count", sql)
+
+    @unittest.skipUnless(
+        getenv("DATABASE_TEST_URI", "").startswith("postgres"),
+        "needs a Postgres test database",
+    )
+    def test_update_team_returning_on_postgres(self):
+        response = self.client().patch(
+            "/teams/1",
+            json={"location": "Austin, Texas"},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(data["previous_team_info"]["location"], "Texas")
+        self.assertEqual(data["new_team_info"]["roster"], [self.player_name])
+        self.assertEqual(
+            response.headers["ETag"],
+            self.client().get("/teams/1").headers["ETag"],
+        )
+
     def test_422_if_update_player_malformed_data(self):
         player = Player.query.filter_by(name=self.player_name).first()
         response = self.client().patch(
@@ -218,6 +769,48 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_update_player_changes_only_given_fields(self):
+        response = self.client().patch(
+            "/players/1",
+            json={"jersey_number": 7},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["previous_player_info"]["jersey_number"], 15)
+        self.assertEqual(data["new_player_info"]["jersey_number"], 7)
+        self.assertEqual(data["new_player_info"]["name"], self.player_name)
+        self.assertEqual(data["new_player_info"]["team"], self.team_name)
+
+    def test_422_if_update_player_team_not_found(self):
+        response = self.client().patch(
+            "/players/1", json={"team_id": 1000}, headers=self.admin_headers
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["message"], "unprocessable")
+        self.assertEqual(Player.query.get(1).team_id, 1)
+
+    def test_412_if_update_player_with_stale_etag(self):
+        etag = self.client().get("/players/1").headers["ETag"]
+        headers = dict(self.admin_headers, **{"If-Match": etag})
+
+        response = self.client().patch(
+            "/players/1", json={"jersey_number": 7}, headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client().patch(
+            "/players/1", json={"jersey_number": 8}, headers=headers
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(data["message"], "precondition failed")
+        self.assertEqual(Player.query.get(1).jersey_number, 7)
+
     def test_401_team_manager_cannot_update_player(self):
         player = Player.query.filter_by(name=self.player_name).first()
         response = self.client().patch(
@@ -242,6 +835,166 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "Header Not Present")
 
+    def test_bulk_move_roster_to_another_team(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().patch(
+            "/players/bulk",
+            json={"filter": {"team_id": 2}, "set": {"team_id": 3}},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["total_updated"], 3)
+        self.assertEqual(Player.query.filter_by(team_id=3).count(), 6)
+
+    def test_422_if_bulk_update_targets_missing_team(self):
+        response = self.client().patch(
+            "/players/bulk",
+            json={"ids": [1], "set": {"team_id": 1000}},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data["message"], "unprocessable")
+
+    def test_bulk_delete_players_by_id(self):
+        self.populate_league(teams=1, players_per_team=3)
+        response = self.client().delete(
+            "/players/bulk",
+            json={"ids": [1, 2, 1000]},
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["deleted"], [1, 2])
+        self.assertEqual(data["total_deleted"], 2)
+        self.assertEqual(Player.query.count(), 2)
+
+    def write_import_file(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def test_import_league_resolves_team_names(self):
+        with tempfile.TemporaryDirectory() as directory:
+            teams = self.write_import_file(
+                directory,
+                "teams.csv",
+                "name,location,division,level\n"
+                'Riot,"Seattle, WA",Womens,Club\n',
+            )
+            players = self.write_import_file(
+                directory,
+                "players.ndjson",
+                '{"name": "Ann", "gender": "F", "jersey_number": 3,'
+                ' "position": "Handler", "team": "Riot"}\n'
+                '{"name": "Bob", "gender": "M", "jersey_number": 7,'
+                ' "position": "Cutter", "team_id": 1}\n',
+            )
+            result = import_league(teams=teams, players=players)
+
+        self.assertEqual(result["teams"], 1)
+        self.assertEqual(result["players"], 2)
+        riot = Team.query.filter_by(name="Riot").one()
+        self.assertEqual(riot.location, "Seattle, WA")
+        self.assertEqual(Player.query.filter_by(name="Ann").one().team, riot)
+        self.assertEqual(Player.query.filter_by(name="Bob").one().team_id, 1)
+
+    def test_import_league_rolls_back_on_invalid_row(self):
+        with tempfile.TemporaryDirectory() as directory:
+            players = self.write_import_file(
+                directory,
+                "players.csv",
+                "name,gender,jersey_number,position,team\n"
+                "Ann,F,3,Handler,\n"
+                "Bob,M,7,Cutter,Nobody\n",
+            )
+            with self.assertRaises(InvalidImportRow) as raised:
+                import_league(players=players)
+
+        self.assertEqual(raised.exception.line, 3)
+        self.assertEqual(Player.query.count(), 1)
+
+    def test_import_league_reports_team_id_that_is_not_an_integer(self):
+        player = {
+            "name": "Ann",
+            "gender": "F",
+            "jersey_number": 3,
+            "position": "Handler",
+            "team_id": "abc",
+        }
+        with self.assertRaises(InvalidImportRow) as raised:
+            import_league(players=[player])
+
+        self.assertEqual(
+            raised.exception.errors, ["team_id must be an integer"]
+        )
+
+    def test_rebuild_indexes_only_for_empty_tables(self):
+        league = SyntheticLeague(teams=3, players=30, seed=1)
+        with self.assertRaises(ValueError):
+            import_league(teams=league.teams(), rebuild_indexes=True)
+
+        Player.query.delete()
+        Team.query.delete()
+        db.session.commit()
+        result = import_league(
+            teams=league.teams(),
+            players=league.players(),
+            rebuild_indexes=True,
+        )
+
+        self.assertEqual(result["players"], 30)
+        self.assertEqual(Team.query.count(), 3)
+
+    def test_synthetic_league_is_deterministic(self):
+        league = SyntheticLeague(teams=20, players=500, seed=7)
+        players = list(league.players())
+
+        self.assertEqual(players, list(SyntheticLeague(20, 500, 7).players()))
+        self.assertNotEqual(
+            players, list(SyntheticLeague(20, 500, 8).players())
+        )
+        self.assertEqual(len(players), 500)
+        self.assertEqual(sum(league.roster_sizes()), 475)
+        self.assertEqual(len({team["name"] for team in league.teams()}), 20)
+
+    def test_importing_a_league_twice_fills_only_the_new_teams(self):
+        league = SyntheticLeague(teams=5, players=100, seed=42)
+        for _ in range(2):
+            import_league(teams=league.teams(), players=league.players())
+
+        rosters = [
+            Player.query.filter_by(team_id=team_id).count()
+            for team_id in range(2, 12)
+        ]
+        self.assertEqual(rosters, league.roster_sizes() * 2)
+        self.assertEqual(Player.query.filter_by(team_id=1).count(), 1)
+
+    def test_load_synthetic_league_from_files(self):
+        league = SyntheticLeague(teams=5, players=100, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            teams, players = write_league(league, directory, "csv")
+            result = import_league(teams=teams, players=players)
+
+        self.assertEqual(result["teams"], 5)
+        self.assertEqual(result["players"], 100)
+        self.assertEqual(Player.query.filter_by(team_id=None).count(), 5)
+
+    def test_422_if_bulk_delete_has_no_selection(self):
+        response = self.client().delete(
+            "/players/bulk", json={}, headers=self.admin_headers
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Player.query.count(), 1)
+
     def test_delete_player_by_id(self):
         response = self.client().delete(
             "/players/1", headers=self.admin_headers
@@ -282,6 +1035,258 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "Header Not Present")
 
+    def test_repeat_token_served_from_verified_token_cache(self):
+        # Signed with a key of its own, so no identity provider is needed
+        with tempfile.TemporaryDirectory() as directory:
+            # A short key, generating a 2048-bit one takes seconds
+            jwks_url, token = local_auth(directory, key_bits=1024)
+            with mock.patch.multiple(
+                "app.auth.auth",
+                AUTH0_DOMAIN=DOMAIN,
+                API_AUDIENCE=AUDIENCE,
+                ALGORITHMS=["RS256"],
+                jwks_cache=JWKSCache(jwks_url, background_refresh=False),
+            ):
+                payload = verify_decode_jwt(token)
+                hits = token_cache.hits
+                repeated = verify_decode_jwt(token)
+
+        self.assertEqual(repeated, payload)
+        self.assertEqual(token_cache.hits, hits + 1)
+        self.assertIsInstance(payload["permissions"], frozenset)
+
+    def test_request_over_query_budget_fails(self):
+        view = self.app.view_functions["players"]
+        self.addCleanup(setattr, view, "query_budget", view.query_budget)
+        view.query_budget = 1
+
+        response = self.client().get("/players")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(data["message"], "query budget exceeded (3 > 1)")
+
+    def test_write_over_query_budget_is_only_logged(self):
+        view = self.app.view_functions["update_player_details"]
+        self.addCleanup(setattr, view, "query_budget", view.query_budget)
+        view.query_budget = 1
+
+        with self.assertLogs("app.diagnostics", "ERROR"):
+            response = self.client().patch(
+                "/players/1",
+                json={"name": "Over Budget"},
+                headers=self.admin_headers,
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Player.query.get(1).name, "Over Budget")
+
+    def test_repeated_statement_is_reported_as_n_plus_one(self):
+        with self.assertLogs("app.diagnostics", "WARNING") as logs:
+            # SQLite inserts bulk rows one statement at a time
+            self.client().post(
+                "/players/bulk",
+                json=[self.new_player] * 5,
+                headers=self.admin_headers,
+            )
+
+        self.assertIn("Possible N+1 on POST /players/bulk", logs.output[0])
+
+    def test_slow_queries_are_logged_with_parameter_shape(self):
+        query_diagnostics.slow_query_seconds = 1e-9
+        try:
+            with self.assertLogs("app.diagnostics", "WARNING") as logs:
+                self.client().get("/players/1")
+        finally:
+            query_diagnostics.slow_query_seconds = None
+
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("on GET /players/<int:player_id>", logs.output[0])
+        self.assertTrue(any("('int'," in line for line in logs.output))
+
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client().get("/metrics").status_code, 404)
+
+        metrics.enabled = True
+        try:
+            self.client().get("/players")
+            self.client().patch(
+                "/players/1",
+                json=self.update_player,
+                headers=self.admin_headers,
+            )
+            response = self.client().get("/metrics")
+        finally:
+            metrics.enabled = False
+        text = response.data.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'http_requests_total{route="/players",method="GET",status="200"}',
+            text,
+        )
+        self.assertIn(
+            'http_request_sql_statements_sum{route="/players",method="GET"}',
+            text,
+        )
+        self.assertIn("auth_jwt_verify_seconds_count 1", text)
+        self.assertIn('response_cache_events_total{event="misses"}', text)
+
+    def create_replica(self, directory):
+        engine = create_engine(f"sqlite:///{directory}/replica.db")
+        db.Model.metadata.create_all(engine)
+        engine.execute(
+            Team.__table__.insert(),
+            name="Replica Team",
+            location="Texas",
+            division="Mixed",
+            level="Club",
+        )
+        engine.execute(
+            Player.__table__.insert(),
+            name="Replica Player",
+            gender="F",
+            jersey_number=7,
+            position="Cutter",
+            team_id=1,
+        )
+        return engine
+
+    def test_get_requests_read_from_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica_router.configure([self.create_replica(directory)])
+            try:
+                response = self.client().get("/players/1")
+                created = self.client().post(
+                    "/players",
+                    json=self.new_player,
+                    headers=self.admin_headers,
+                )
+                stats = json.loads(
+                    self.client()
+                    .get("/pool/stats", headers=self.admin_headers)
+                    .data
+                )
+            finally:
+                replica_router.configure([])
+
+        self.assertEqual(
+            json.loads(response.data)["player"]["name"], "Replica Player"
+        )
+        self.assertEqual(created.status_code, 200)
+        self.assertEqual(Player.query.count(), 2)
+        self.assertEqual(stats["replicas"]["replicas"], 1)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica_router.configure([self.create_replica(directory)])
+            try:
+                with self.app.test_request_context("/players/1"):
+                    before = db.session.query(Player.name).scalar()
+                    db.session.add(Team(**self.new_team))
+                    db.session.flush()
+                    after = db.session.query(Player.name).scalar()
+                    db.session.rollback()
+            finally:
+                db.session.remove()
+                replica_router.configure([])
+
+        self.assertEqual(before, "Replica Player")
+        self.assertEqual(after, self.player_name)
+
+    def test_cache_refilled_once_the_replica_caught_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica = self.create_replica(directory)
+            replica_router.configure([replica])
+            try:
+                self.client().patch(
+                    "/players/1",
+                    json={"name": "Primary Player"},
+                    headers=self.admin_headers,
+                )
+                # The replica has not replayed the write yet
+                stale = json.loads(self.client().get("/players/1").data)
+                hits = response_cache.hits
+                self.client().get("/players/1")
+                hits = response_cache.hits - hits
+
+                replica.execute(
+                    Player.__table__.update().values(name="Primary Player")
+                )
+                replica.execute(
+                    TableVersion.__table__.update()
+                    .where(TableVersion.name == Player.__tablename__)
+                    .values(version=TableVersion.version + 1)
+                )
+                response = self.client().get("/players/1")
+            finally:
+                replica_router.configure([])
+
+        self.assertEqual(stale["player"]["name"], "Replica Player")
+        self.assertEqual(hits, 1)
+        self.assertEqual(
+            json.loads(response.data)["player"]["name"], "Primary Player"
+        )
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        replica_router.configure(
+            [create_engine("sqlite:////nonexistent/directory/replica.db")]
+        )
+        fallbacks = replica_router.primary_fallbacks
+        try:
+            with self.assertLogs("app.database.replicas", "WARNING"):
+                response = self.client().get("/players/1")
+        finally:
+            replica_router.configure([])
+
+        self.assertEqual(
+            json.loads(response.data)["player"]["name"], self.player_name
+        )
+        self.assertEqual(replica_router.primary_fallbacks, fallbacks + 1)
+
+    def test_failed_replica_read_is_retried_on_primary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            replica = self.create_replica(directory)
+            replica_router.configure([replica])
+            try:
+                # The replica passes its health check, then its reads fail
+                replica.execute("DROP TABLE player")
+                with self.assertLogs("app.database.replicas", "WARNING"):
+                    response = self.client().get("/players/1")
+                down = replica_router.replicas[0].down_until
+            finally:
+                replica_router.configure([])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.data)["player"]["name"], self.player_name
+        )
+        self.assertGreater(down, time.monotonic())
+
+    def test_startup_time_is_recorded(self):
+        self.assertGreater(self.app.config["STARTUP_SECONDS"], 0)
+
+    def test_verify_schema_revision(self):
+        db.session.execute("CREATE TABLE alembic_version (version_num TEXT)")
+        db.session.execute(
+            "INSERT INTO alembic_version VALUES ('8d8de8c2cf47')"
+        )
+        db.session.commit()
+        try:
+            with self.assertRaises(RuntimeError):
+                verify_schema_revision()
+
+            head = ScriptDirectory(MIGRATIONS_DIRECTORY).get_current_head()
+            db.session.execute(
+                "UPDATE alembic_version SET version_num = :head",
+                {"head": head},
+            )
+            db.session.commit()
+            verify_schema_revision()
+        finally:
+            db.session.execute("DROP TABLE alembic_version")
+            db.session.commit()
+
     """The following tests are for all of the application's team endpoints"""
 
     def test_get_teams(self):
@@ -293,6 +1298,64 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertTrue(data["teams"])
         self.assertTrue(data["total_teams"])
 
+    def test_teams_listing_etag_changes_after_write(self):
+        etag = self.client().get("/teams").headers["ETag"]
+
+        response = self.client().get("/teams", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        Player(
+            name="New Player", gender="M", jersey_number=1, position="Cutter"
+        ).insert()
+        response = self.client().get("/teams", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_teams_listing_is_compressed_from_the_cache(self):
+        self.populate_league(teams=10, players_per_team=5)
+        headers = {"Accept-Encoding": "br;q=0.5, gzip"}
+        response = self.client().get("/teams", headers=headers)
+        data = json.loads(gzip.decompress(response.data))
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(data["total_teams"], 11)
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+
+        hits = response_cache.hits
+        cached = self.client().get("/teams", headers=headers)
+        self.assertEqual(response_cache.hits, hits + 1)
+        self.assertEqual(cached.data, response.data)
+
+        headers["If-None-Match"] = response.headers["ETag"]
+        response = self.client().get("/teams", headers=headers)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cache_compresses_each_encoding_on_first_hit(self):
+        self.populate_league(teams=10, players_per_team=5)
+        key = repr(("/teams", []))
+        response = self.client().get(
+            "/teams", headers={"Accept-Encoding": "gzip"}
+        )
+        encoded = dict(response_cache.backend.get(key)["encoded"])
+
+        self.client().get("/teams", headers={"Accept-Encoding": "gzip"})
+        cached = response_cache.backend.get(key)
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(encoded, {})
+        self.assertEqual(list(cached["encoded"]), ["gzip"])
+        self.assertEqual(cached["encoded"]["gzip"], response.data)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client().get(
+            "/teams/1", headers={"Accept-Encoding": "gzip"}
+        )
+
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertTrue(json.loads(response.data)["success"])
+
     def test_404_if_page_contains_no_teams(self):
         response = self.client().get("/teams?page=1000")
         data = json.loads(response.data)
@@ -301,6 +1364,43 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_get_teams_with_cursor(self):
+        response = self.client().get("/teams?limit=1")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data["teams"]), 1)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_teams_query_count_is_constant_per_page(self):
+        self.populate_league()
+
+        self.assertEqual(
+            self.count_queries("/teams?limit=1"),
+            self.count_queries("/teams?limit=6"),
+        )
+        self.assertEqual(self.count_queries("/teams"), 4)
+        self.assertEqual(self.count_queries("/teams/2"), 4)
+
+    def test_export_teams_with_rosters(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get("/teams/export?division=Mixed")
+        rows = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(len(rows[0]["roster"]), 3)
+
+    def test_export_is_compressed_as_it_streams(self):
+        self.populate_league(teams=10, players_per_team=5)
+        identity = self.client().get("/players/export")
+        response = self.client().get(
+            "/players/export", headers={"Accept-Encoding": "gzip"}
+        )
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.data), identity.data)
+
     def test_get_team_details_by_id(self):
         team = Team.query.filter_by(name=self.team_name).first()
         response = self.client().get(f"/teams/{team.id}")
@@ -310,6 +1410,89 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertTrue(data["team"])
 
+    def test_team_etag_only_changes_with_its_own_roster(self):
+        self.populate_league(teams=2, players_per_team=3)
+        etag = self.client().get("/teams/2").headers["ETag"]
+
+        player = Player.query.filter_by(team_id=3).first()
+        player.jersey_number = 99
+        player.update()
+        response = self.client().get(
+            "/teams/2", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        player = Player.query.filter_by(team_id=2).first()
+        player.name = "Renamed Player"
+        player.update()
+        response = self.client().get(
+            "/teams/2", headers={"If-None-Match": etag}
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Renamed Player", data["team"]["roster"])
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_get_teams_with_roster_count(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get("/teams?roster=count")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [team["roster_count"] for team in data["teams"]], [1, 3, 3]
+        )
+        self.assertNotIn("roster", data["teams"][0])
+
+    def test_get_team_details_without_roster(self):
+        response = self.client().get("/teams/1?roster=none")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("roster", data["team"])
+        self.assertNotIn("roster_count", data["team"])
+
+    def test_get_teams_with_sparse_fields(self):
+        self.populate_league(teams=2, players_per_team=3)
+        response = self.client().get("/teams?fields=name,roster")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(data["teams"][0]), {"name", "roster"})
+
+        # No roster query without "roster" in the fields
+        self.assertEqual(self.count_queries("/teams?fields=id,name"), 3)
+
+    def test_400_if_roster_mode_unknown(self):
+        response = self.client().get("/teams/1?roster=everything")
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_team_players_with_cursor(self):
+        self.populate_league(teams=1, players_per_team=5)
+        response = self.client().get("/teams/2/players?limit=3&with_total=1")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data["players"]), 3)
+        self.assertEqual(data["total_players"], 5)
+
+        response = self.client().get(
+            f"/teams/2/players?limit=3&after={data['next_cursor']}"
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(len(data["players"]), 2)
+        self.assertIsNone(data["next_cursor"])
+
+    def test_404_if_team_players_team_not_found(self):
+        response = self.client().get("/teams/1000/players")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data["message"], "resource not found")
+
     def test_404_if_team_not_found_by_id(self):
         response = self.client().get("/teams/1000")
         data = json.loads(response.data)
@@ -340,6 +1523,21 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    def test_bulk_create_teams_from_ndjson(self):
+        body = "\n".join(json.dumps(self.new_team) for _ in range(3))
+        response = self.client().post(
+            "/teams/bulk",
+            data=body,
+            content_type="application/x-ndjson",
+            headers=self.admin_headers,
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 3)
+        self.assertEqual(Team.query.count(), 4)
+
     def test_401_team_manager_cannot_post_team(self):
         response = self.client().post(
             "/teams", json=self.new_team, headers=self.team_manager_headers
@@ -372,6 +1570,20 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertTrue(data["new_team_info"])
         self.assertTrue(data["previous_team_info"])
 
+    def test_update_team_returns_the_new_etag(self):
+        response = self.client().patch(
+            "/teams/1", json={"level": "Club"}, headers=self.admin_headers
+        )
+        etag = self.client().get("/teams/1").headers["ETag"]
+        chained = self.client().patch(
+            "/teams/1",
+            json={"level": "College"},
+            headers=dict(self.admin_headers, **{"If-Match": etag}),
+        )
+
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(chained.status_code, 200)
+
     def test_422_if_update_team_malformed_data(self):
         team = Team.query.filter_by(name=self.team_name).first()
         response = self.client().patch(
@@ -395,6 +1607,18 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_412_if_update_team_with_stale_etag(self):
+        response = self.client().patch(
+            "/teams/1",
+            json={"location": "Dallas, Texas"},
+            headers=dict(self.admin_headers, **{"If-Match": "team-1-v9-r"}),
+        )
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(Team.query.get(1).location, "Texas")
+
     def test_401_team_manager_cannot_update_team(self):
         team = Team.query.filter_by(name=self.team_name).first()
         response = self.client().patch(
@@ -427,6 +1651,52 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertEqual(data["deleted"], 1)
 
+    def test_delete_team_detaches_roster(self):
+        self.populate_league(teams=1, players_per_team=3)
+        response = self.client().delete("/teams/2", headers=self.admin_headers)
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["players_detached"], 3)
+        self.assertEqual(Player.query.filter_by(team_id=None).count(), 3)
+        self.assertIsNone(Team.query.get(2))
+
+    def test_unknown_team_delete_policy_fails_at_startup(self):
+        app = Flask(__name__)
+        app.config["TEAM_DELETE_POLICY"] = "orphan"
+
+        with self.assertRaises(ValueError):
+            init_bulk(app)
+
+    def test_delete_team_cascades_to_roster(self):
+        self.populate_league(teams=1, players_per_team=3)
+        self.app.config["TEAM_DELETE_POLICY"] = "cascade"
+        try:
+            response = self.client().delete(
+                "/teams/2", headers=self.admin_headers
+            )
+        finally:
+            self.app.config["TEAM_DELETE_POLICY"] = "detach"
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["players_deleted"], 3)
+        self.assertEqual(Player.query.count(), 1)
+
+    def test_409_if_delete_team_with_roster_is_restricted(self):
+        self.app.config["TEAM_DELETE_POLICY"] = "restrict"
+        try:
+            response = self.client().delete(
+                "/teams/1", headers=self.admin_headers
+            )
+        finally:
+            self.app.config["TEAM_DELETE_POLICY"] = "detach"
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(data["message"], "conflict")
+        self.assertIsNotNone(Team.query.get(1))
+
     def test_404_if_delete_team_id_not_found(self):
         response = self.client().delete(
             "/teams/1000", headers=self.admin_headers
@@ -458,6 +1728,347 @@ class UltimatePlayersTestCase(unittest.TestCase):
         self.assertEqual(data["message"], "Header Not Present")
 
 
+class JWKSCacheTestCase(unittest.TestCase):
+    """Tests for the in-process JWKS cache against a local JWKS file"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.write_keys("first")
+        self.cache = JWKSCache(
+            f"file://{self.path}",
+            min_refresh_interval=0,
+            background_refresh=False,
+        )
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write_keys(self, *kids):
+        keys = [
+            {"kty": "RSA", "kid": kid, "use": "sig", "n": "abc", "e": "AQAB"}
+            for kid in kids
+        ]
+        with open(self.path, "w") as jwks_file:
+            json.dump({"keys": keys}, jwks_file)
+
+    def test_keys_fetched_once_within_ttl(self):
+        for _ in range(5):
+            self.assertEqual(self.cache.get_key("first")["kid"], "first")
+
+        self.assertEqual(self.cache.fetches, 1)
+
+    def test_unknown_kid_triggers_refresh(self):
+        self.cache.get_key("first")
+        self.write_keys("first", "second")
+
+        self.assertEqual(self.cache.get_key("second")["kid"], "second")
+        self.assertEqual(self.cache.fetches, 2)
+        self.assertEqual(self.cache.version, 2)
+
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        self.cache.min_refresh_interval = 60
+        self.cache.get_key("first")
+
+        self.assertIsNone(self.cache.get_key("missing"))
+        self.assertIsNone(self.cache.get_key("missing"))
+        self.assertEqual(self.cache.fetches, 1)
+
+    def test_stale_keys_served_when_provider_unavailable(self):
+        self.cache.get_key("first")
+        os.remove(self.path)
+        self.cache._expires_at = 0
+
+        self.assertEqual(self.cache.get_key("first")["kid"], "first")
+        self.assertEqual(self.cache.errors, 1)
+
+    def test_raises_when_no_keys_available(self):
+        os.remove(self.path)
+
+        with self.assertRaises(JWKSUnavailable):
+            self.cache.get_key("first")
+
+    def run_concurrently(self, target, threads=8):
+        barrier = threading.Barrier(threads)
+
+        def run():
+            barrier.wait()
+            target()
+
+        workers = [threading.Thread(target=run) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def test_concurrent_kid_misses_fetch_once(self):
+        self.cache.get_key("first")
+        self.write_keys("first", "second")
+        fetch = self.cache._fetch
+
+        def slow_fetch():
+            time.sleep(0.05)
+            return fetch()
+
+        self.cache._fetch = slow_fetch
+        found = []
+        self.run_concurrently(
+            lambda: found.append(self.cache.get_key("second")["kid"])
+        )
+
+        self.assertEqual(found, ["second"] * 8)
+        self.assertEqual(self.cache.fetches, 2)
+
+    def test_refresher_thread_started_once(self):
+        self.cache.background_refresh = True
+
+        def slow_getpid():
+            # Widens the window between checking and setting the pid
+            time.sleep(0.01)
+            return os.getpid()
+
+        with mock.patch("app.auth.jwks.threading") as jwks_threading:
+            with mock.patch("app.auth.jwks.getpid", slow_getpid):
+                self.run_concurrently(self.cache._ensure_refresher)
+
+        jwks_threading.Thread.assert_called_once()
+        jwks_threading.Thread.return_value.start.assert_called_once_with()
+
+
+class VerifiedTokenCacheTestCase(unittest.TestCase):
+    """Tests for the bounded cache of verified token payloads"""
+
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_size=2)
+        self.payload = {
+            "sub": "user",
+            "exp": time.time() + 60,
+            "permissions": ["create:players"],
+        }
+
+    def test_cached_payload_has_frozen_permissions(self):
+        self.cache.put("token", self.payload)
+        payload = self.cache.get("token")
+
+        self.assertEqual(payload["permissions"], frozenset(["create:players"]))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_cached_payload_cannot_be_changed(self):
+        self.cache.put("token", dict(self.payload, aud=["api"]))
+        payload = self.cache.get("token")
+
+        with self.assertRaises(TypeError):
+            payload["permissions"] = ["delete:teams"]
+        self.assertEqual(payload["aud"], ("api",))
+
+    def test_expired_token_is_not_served(self):
+        self.cache.put("token", dict(self.payload, exp=time.time() - 1))
+
+        self.assertIsNone(self.cache.get("token"))
+        self.assertEqual(self.cache.expirations, 1)
+
+    def test_least_recently_used_token_is_evicted(self):
+        self.cache.put("first", self.payload)
+        self.cache.put("second", self.payload)
+        self.cache.get("first")
+        self.cache.put("third", self.payload)
+
+        self.assertIsNone(self.cache.get("second"))
+        self.assertIsNotNone(self.cache.get("first"))
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_token_without_expiry_is_not_cached(self):
+        self.cache.put("token", {"sub": "user"})
+
+        self.assertIsNone(self.cache.get("token"))
+
+    def test_cleared_when_jwks_rotates(self):
+        jwks = JWKSCache("file:///does/not/exist", background_refresh=False)
+        jwks.on_rotate(lambda cache: self.cache.clear())
+        self.cache.put("token", self.payload)
+
+        jwks._fetch = lambda: {"keys": [{"kid": "new", "kty": "RSA"}]}
+        jwks.refresh()
+
+        self.assertIsNone(self.cache.get("token"))
+        self.assertEqual(self.cache.invalidations, 1)
+
+
+class EngineOptionsTestCase(unittest.TestCase):
+    """Tests for the connection pool settings"""
+
+    def setUp(self):
+        self.config = {
+            "SQLALCHEMY_DATABASE_URI": "postgresql://localhost/league",
+            "DB_POOL_SIZE": 3,
+            "DB_MAX_OVERFLOW": 2,
+            "DB_POOL_TIMEOUT": 5,
+            "DB_POOL_RECYCLE": 60,
+            "DB_POOL_PRE_PING": True,
+            "DB_STATEMENT_TIMEOUT_MS": 1500,
+        }
+
+    def test_pool_options_from_config(self):
+        options = engine_options(self.config)
+
+        self.assertIs(options["poolclass"], TimedQueuePool)
+        self.assertEqual(options["pool_size"], 3)
+        self.assertEqual(options["max_overflow"], 2)
+        self.assertEqual(
+            options["connect_args"]["options"], "-c statement_timeout=1500"
+        )
+
+    def test_sqlite_keeps_default_pool(self):
+        self.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+
+        self.assertEqual(engine_options(self.config), {})
+
+    def test_pool_checkout_wait_is_recorded(self):
+        engine = create_engine(
+            "sqlite://", poolclass=TimedQueuePool, pool_size=1
+        )
+        checkouts = pool_stats.checkouts
+        engine.connect().close()
+
+        self.assertEqual(pool_stats.checkouts, checkouts + 1)
+
+    def test_fork_hook_is_registered_once_for_live_engines(self):
+        engines = [create_engine("sqlite://"), create_engine("sqlite://")]
+        with mock.patch.multiple(
+            "app.database.pool",
+            fork_hook_registered=False,
+            engines_to_dispose=weakref.WeakSet(),
+        ), mock.patch("os.register_at_fork") as register_at_fork:
+            dispose_before_fork(engines[0])
+            dispose_before_fork(engines[1])
+            del engines[1]
+            gc.collect()
+
+            pool = engines[0].pool
+            register_at_fork.call_args[1]["before"]()
+
+            self.assertEqual(len(pool_module.engines_to_dispose), 1)
+
+        register_at_fork.assert_called_once()
+        self.assertIsNot(engines[0].pool, pool)
+
+
+class LocalRedis:
+    """Local stand-in for the parts of a Redis client the cache uses"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.values[name] = value
+
+    def sadd(self, name, *members):
+        self.values.setdefault(name, set()).update(members)
+
+    def smembers(self, name):
+        return self.values.get(name, set())
+
+    def expire(self, name, seconds):
+        pass
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+
+    def scan_iter(self, match):
+        return [name for name in self.values if name.startswith(match[:-1])]
+
+
+class ResponseCacheBackendTestCase(unittest.TestCase):
+    """Tests for the response cache backends"""
+
+    def check_tag_invalidation(self, backend):
+        backend.set("players", {"body": b"[]"}, {"players"})
+        backend.set("player-1", {"body": b"{}"}, {"player:1", "team:1"})
+        backend.set("team-2", {"body": b"{}"}, {"team:2"})
+
+        self.assertEqual(backend.invalidate({"team:1", "players"}), 2)
+        self.assertIsNone(backend.get("players"))
+        self.assertIsNone(backend.get("player-1"))
+        self.assertEqual(backend.get("team-2"), {"body": b"{}"})
+
+    def test_memory_backend_invalidates_by_tag(self):
+        self.check_tag_invalidation(MemoryBackend())
+
+    def test_redis_backend_invalidates_by_tag(self):
+        self.check_tag_invalidation(RedisBackend(LocalRedis()))
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set("first", 1, {"a"})
+        backend.set("second", 2, {"b"})
+        backend.get("first")
+        backend.set("third", 3, {"c"})
+
+        self.assertIsNone(backend.get("second"))
+        self.assertEqual(backend.get("first"), 1)
+        self.assertEqual(backend.stats()["evictions"], 1)
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Tests for the Prometheus metric types"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram(
+            "latency_seconds", "Latency", buckets=(0.1, 1), labels=("route",)
+        )
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, "/players")
+
+        samples = [
+            (name + labels, value)
+            for name, labels, value in histogram.samples()
+        ]
+        self.assertEqual(
+            samples,
+            [
+                ('latency_seconds_bucket{route="/players",le="0.1"}', 2),
+                ('latency_seconds_bucket{route="/players",le="1"}', 3),
+                ('latency_seconds_bucket{route="/players",le="+Inf"}', 4),
+                ('latency_seconds_sum{route="/players"}', 3.65),
+                ('latency_seconds_count{route="/players"}', 4),
+            ],
+        )
+
+
+class SerializationTestCase(unittest.TestCase):
+    """Tests for the JSON serialization backends"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.payload = {
+            "success": True,
+            "players": [{"name": "Doe Johnson", "id": 1, "team": ""}],
+            "roster_count": {2: 3},
+        }
+
+    def test_stdlib_backend_matches_flask_jsonify(self):
+        with self.app.app_context():
+            expected = self.app.json_encoder(
+                separators=(",", ":"), sort_keys=True
+            ).encode({"a": [1, 2], "b": None})
+
+        self.assertEqual(
+            StdlibBackend().dumps({"b": None, "a": [1, 2]}), expected.encode(),
+        )
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_backend_matches_stdlib_backend(self):
+        self.assertEqual(
+            OrjsonBackend().dumps(self.payload),
+            StdlibBackend().dumps(self.payload),
+        )
+
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()